@@ -0,0 +1,203 @@
+import os
+import time
+import sqlite3
+import threading
+from datetime import datetime
+from notion_index import ArticleIndex
+from article_dedup import unique_articles
+from notion_agent import plain_text
+
+def quote_query(query):
+    """
+    Turns free text into an FTS5 query matching every word literally,
+    so input like gpt-5, C++ or what's new isn't parsed as query syntax.
+    """
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+class ArticleArchive:
+    """
+    Local SQLite archive of every published article with a full-text (FTS5)
+    index over title, summary and takeaways, so history questions
+    ("what did we read about X last month") don't need Notion queries.
+    Articles are keyed like the Notion index (normalized URL, else content hash),
+    so re-archiving the same article updates it instead of adding a copy.
+    """
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("ARCHIVE_PATH", "article_archive.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            " id INTEGER PRIMARY KEY,"
+            " key TEXT UNIQUE NOT NULL,"
+            " title TEXT NOT NULL,"
+            " url TEXT,"
+            " summary TEXT,"
+            " takeaways TEXT,"
+            " category TEXT,"
+            " newsletter TEXT,"
+            " subject TEXT,"
+            " date TEXT,"
+            " must_read INTEGER,"
+            " notion_id TEXT,"
+            " archived_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS articles_date ON articles (date);"
+            "CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5("
+            " title, summary, takeaways, content='articles', content_rowid='id');"
+            # Keep the external-content FTS index in sync with the table
+            "CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN"
+            " INSERT INTO articles_fts (rowid, title, summary, takeaways)"
+            " VALUES (new.id, new.title, new.summary, new.takeaways); END;"
+            "CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN"
+            " INSERT INTO articles_fts (articles_fts, rowid, title, summary, takeaways)"
+            " VALUES ('delete', old.id, old.title, old.summary, old.takeaways); END;"
+            "CREATE TRIGGER IF NOT EXISTS articles_au AFTER UPDATE ON articles BEGIN"
+            " INSERT INTO articles_fts (articles_fts, rowid, title, summary, takeaways)"
+            " VALUES ('delete', old.id, old.title, old.summary, old.takeaways);"
+            " INSERT INTO articles_fts (rowid, title, summary, takeaways)"
+            " VALUES (new.id, new.title, new.summary, new.takeaways); END;"
+        )
+        self._conn.commit()
+
+    def add_newsletter(self, newsletter, date=None):
+        """
+        Archives a processed newsletter's articles ('name', 'subject', 'articles').
+        Articles merged into another newsletter's copy are archived only once.
+        """
+        date = date or datetime.now().strftime("%Y-%m-%d")
+        articles = [dict(article, newsletter_name=", ".join(article.get("sources") or [newsletter["name"]]),
+                         newsletter_subject=newsletter["subject"], date=date)
+                    for article in unique_articles(newsletter)]
+        self.add_articles(articles)
+
+    def add_articles(self, articles):
+        """
+        Inserts or updates article dicts (title, url, summary, takeaways, category,
+        newsletter_name, newsletter_subject, date, must_read, notion_id).
+        """
+        now = time.time()
+        rows = [(
+            ArticleIndex.keys_for(article)[0],
+            article.get("title") or "",
+            article.get("url"),
+            article.get("summary") or "",
+            "\n".join(article.get("takeaways") or []),
+            article.get("category"),
+            article.get("newsletter_name"),
+            article.get("newsletter_subject"),
+            article.get("date"),
+            int(bool(article.get("must_read"))),
+            article.get("notion_id"),
+            now,
+        ) for article in articles]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO articles (key, title, url, summary, takeaways, category, newsletter, subject,"
+                " date, must_read, notion_id, archived_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET title = excluded.title, url = excluded.url,"
+                " summary = excluded.summary,"
+                " takeaways = CASE WHEN excluded.takeaways != '' THEN excluded.takeaways ELSE takeaways END,"
+                " category = excluded.category, newsletter = excluded.newsletter, subject = excluded.subject,"
+                " date = COALESCE(date, excluded.date), must_read = excluded.must_read,"
+                " notion_id = COALESCE(excluded.notion_id, notion_id), archived_at = excluded.archived_at",
+                rows
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def search(self, query=None, category=None, newsletter=None, since=None, until=None, limit=20):
+        """
+        Full-text search (FTS5 query syntax: words, "phrases", OR, prefix*) with
+        optional filters. since/until are YYYY-MM-DD dates, inclusive.
+        A query that isn't valid FTS5 syntax is retried with every word quoted.
+        Returns dicts ordered by relevance, or newest first when there is no query.
+        """
+        conditions = []
+        params = []
+        if query:
+            conditions.append("articles_fts MATCH ?")
+            params.append(query)
+        if category:
+            conditions.append("a.category = ? COLLATE NOCASE")
+            params.append(category)
+        if newsletter:
+            conditions.append("a.newsletter LIKE ?")
+            params.append(f"%{newsletter}%")
+        if since:
+            conditions.append("a.date >= ?")
+            params.append(since)
+        if until:
+            conditions.append("a.date <= ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        if query:
+            sql = ("SELECT a.*, snippet(articles_fts, 1, '[', ']', '…', 16) AS snippet"
+                   " FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid"
+                   f" {where} ORDER BY bm25(articles_fts) LIMIT ?")
+        else:
+            sql = f"SELECT a.*, NULL AS snippet FROM articles a {where} ORDER BY a.date DESC, a.id DESC LIMIT ?"
+        with self._lock:
+            try:
+                rows = self._conn.execute(sql, params + [limit]).fetchall()
+            except sqlite3.OperationalError:
+                if not query:
+                    raise
+                params[0] = quote_query(query)
+                rows = self._conn.execute(sql, params + [limit]).fetchall()
+
+        results = []
+        for row in rows:
+            result = dict(row)
+            result["takeaways"] = [t for t in (row["takeaways"] or "").split("\n") if t]
+            result["must_read"] = bool(row["must_read"])
+            results.append(result)
+        return results
+
+    def import_from_notion(self, notion):
+        """
+        Backfills the archive from the Notion Articles DB (paginated databases.query).
+        Takeaways live in page bodies rather than properties, so imported
+        articles have none unless they were also archived by a run.
+        """
+        imported = 0
+        batch = []
+        for page in notion.iter_article_pages():
+            batch.append(article_from_page(page))
+            if len(batch) == 100:
+                imported += self.add_articles(batch)
+                batch = []
+                print(f"Imported {imported} articles...")
+        if batch:
+            imported += self.add_articles(batch)
+        print(f"Imported {imported} articles ({self.count()} in archive).")
+        return imported
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM articles")
+            self._conn.commit()
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+def article_from_page(page):
+    """
+    Converts an Articles DB page (databases.query result) into an article dict.
+    """
+    props = page.get("properties", {})
+    category = (props.get("Category", {}).get("select") or {}).get("name")
+    date = (props.get("Date Processed", {}).get("date") or {}).get("start")
+    return {
+        "title": plain_text(props.get("Article Title", {}).get("title", [])),
+        "url": props.get("Article Link", {}).get("url"),
+        "summary": plain_text(props.get("Summary", {}).get("rich_text", [])),
+        "category": category,
+        "newsletter_name": plain_text(props.get("Newsletter Name", {}).get("rich_text", [])),
+        "newsletter_subject": plain_text(props.get("Newsletter Subject Line", {}).get("rich_text", [])),
+        "date": date or (page.get("created_time") or "")[:10] or None,
+        "must_read": props.get("Must-Read", {}).get("checkbox", False),
+        "notion_id": page["id"],
+    }
@@ -0,0 +1,114 @@
+import os
+import re
+import zlib
+import random
+import threading
+from content_preprocessor import strip_tracking_params, unwrap_redirect
+from notion_index import normalize_url
+
+# MinHash signature length and LSH banding (16 bands x 4 rows ~ candidates from Jaccard 0.5)
+NUM_PERMUTATIONS = 64
+BANDS = 16
+# Mersenne prime for the (a * x + b) mod p hash family
+PRIME = (1 << 61) - 1
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is",
+    "it", "its", "new", "of", "on", "or", "that", "the", "this", "to", "was", "will", "with",
+}
+
+def shingles(article):
+    """
+    Word bigrams of the article's title and summary (lower-cased, stopwords dropped),
+    plus the title words themselves so short summaries still match on headline.
+    """
+    def words(text):
+        return [w for w in re.findall(r"[a-z0-9]+", (text or "").lower()) if w not in STOPWORDS]
+
+    title = words(article.get("title"))
+    body = title + words(article.get("summary"))
+    grams = {f"{a} {b}" for a, b in zip(body, body[1:])}
+    grams.update(f"t:{w}" for w in title)
+    return grams
+
+class ArticleDeduplicator:
+    """
+    Run-wide clustering of articles extracted from different newsletters.
+    Articles with the same canonical URL, or whose title+summary MinHash
+    similarity reaches the threshold, are merged into the first one seen:
+    later copies are marked 'duplicate_of' and skipped when publishing, and
+    the primary's 'sources' lists every newsletter that covered the story.
+    """
+    def __init__(self, threshold=None):
+        self.threshold = threshold or float(os.environ.get("ARTICLE_DEDUP_THRESHOLD", 0.5))
+        rng = random.Random(0)
+        self._hashes = [(rng.randrange(1, PRIME), rng.randrange(0, PRIME)) for _ in range(NUM_PERMUTATIONS)]
+        self._rows = NUM_PERMUTATIONS // BANDS
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """
+        Forgets all clusters (the daemon starts afresh after each daily summary).
+        """
+        with self._lock:
+            self._by_url = {}
+            self._buckets = {}
+            self._signatures = []
+            self.merged = 0
+
+    def signature(self, article):
+        grams = shingles(article)
+        if not grams:
+            return None
+        values = [zlib.crc32(gram.encode("utf-8")) for gram in grams]
+        return [min((a * v + b) % PRIME for v in values) for a, b in self._hashes]
+
+    def add(self, article):
+        """
+        Strips tracking parameters from the article's URL and assigns it to a cluster.
+        Returns the primary article if this one is a duplicate, else None
+        (the article becomes the primary of a new cluster).
+        """
+        if article.get("url"):
+            article["url"] = strip_tracking_params(unwrap_redirect(article["url"]))
+        url = normalize_url(article.get("url"))
+        signature = self.signature(article)
+        bands = [tuple(signature[i:i + self._rows]) for i in range(0, NUM_PERMUTATIONS, self._rows)] if signature else []
+
+        with self._lock:
+            primary = self._by_url.get(url) if url else None
+            if primary is None and signature:
+                primary = self._most_similar(signature, bands)
+
+            if primary is None:
+                article.setdefault("sources", [article.get("newsletter_name")])
+                if url:
+                    self._by_url[url] = article
+                if signature:
+                    index = len(self._signatures)
+                    self._signatures.append((signature, article))
+                    for band, key in enumerate(bands):
+                        self._buckets.setdefault((band, key), []).append(index)
+                return None
+
+            if article.get("newsletter_name") not in primary["sources"]:
+                primary["sources"].append(article.get("newsletter_name"))
+            self.merged += 1
+        return primary
+
+    def _most_similar(self, signature, bands):
+        candidates = {index for band, key in enumerate(bands) for index in self._buckets.get((band, key), [])}
+        best, best_score = None, self.threshold
+        for index in candidates:
+            other, article = self._signatures[index]
+            score = sum(1 for x, y in zip(signature, other) if x == y) / NUM_PERMUTATIONS
+            if score >= best_score:
+                best, best_score = article, score
+        return best
+
+def unique_articles(newsletter):
+    """
+    The newsletter's articles that weren't merged into another newsletter's copy.
+    """
+    return [article for article in newsletter["articles"] if not article.get("duplicate_of")]
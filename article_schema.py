@@ -0,0 +1,142 @@
+import json
+from urllib.parse import urlparse
+
+TOP_ARTICLES = 5
+
+# Gemini response schema (OpenAPI subset) for one newsletter's articles
+ARTICLE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING"},
+        "url": {"type": "STRING"},
+        "summary": {"type": "STRING"},
+        "takeaways": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "category": {"type": "STRING"},
+        "must_read": {"type": "BOOLEAN"},
+        "rank": {"type": "INTEGER"},
+    },
+    "required": ["title", "url", "summary", "takeaways", "category", "must_read", "rank"],
+}
+ARTICLES_SCHEMA = {"type": "ARRAY", "items": ARTICLE_SCHEMA}
+
+# Batched requests: response schemas can't express a map keyed by id, so use a list of entries
+BATCH_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "newsletter_id": {"type": "STRING"},
+            "articles": ARTICLES_SCHEMA,
+        },
+        "required": ["newsletter_id", "articles"],
+    },
+}
+
+def generation_config(schema):
+    """
+    Gemini generation config for JSON mode constrained to `schema`.
+    """
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+def parse_reply(text):
+    """
+    Parses a JSON reply, stripping markdown code fences if present.
+    If the reply is malformed (e.g. truncated at the output token limit), salvages
+    every complete element of the top-level array instead of discarding it all.
+    Raises ValueError when nothing can be recovered.
+    """
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    text = text.strip()
+
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        error = e
+
+    start = text.find("[")
+    if start == -1:
+        raise ValueError(f"Unparseable reply: {error}")
+    decoder = json.JSONDecoder()
+    items = []
+    pos = start + 1
+    while True:
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(text) or text[pos] == "]":
+            break
+        try:
+            item, pos = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            break
+        items.append(item)
+    if not items:
+        raise ValueError(f"Unparseable reply: {error}")
+    print(f"  - Salvaged {len(items)} complete items from a malformed reply.")
+    return items
+
+def valid_url(url):
+    parsed = urlparse(url)
+    return parsed.scheme in ("http", "https") and bool(parsed.netloc) and " " not in url
+
+def validate_article(article):
+    """
+    Returns a cleaned copy of one article dict, or None if it can't be used.
+    Title and summary are required. A missing or malformed URL is set to None
+    (the article is kept without a link); rank, must_read, takeaways and
+    category are repaired when missing or malformed.
+    """
+    if not isinstance(article, dict):
+        return None
+    title = article.get("title")
+    url = article.get("url")
+    summary = article.get("summary")
+    if not isinstance(title, str) or not title.strip():
+        return None
+    if not isinstance(summary, str):
+        return None
+
+    cleaned = dict(article)
+    cleaned["title"] = title.strip()
+    cleaned["url"] = url.strip() if isinstance(url, str) and valid_url(url.strip()) else None
+
+    takeaways = article.get("takeaways")
+    if isinstance(takeaways, str):
+        takeaways = [takeaways]
+    cleaned["takeaways"] = [t for t in takeaways if isinstance(t, str) and t.strip()] if isinstance(takeaways, list) else []
+
+    category = article.get("category")
+    cleaned["category"] = category.strip() if isinstance(category, str) and category.strip() else "Uncategorized"
+
+    try:
+        rank = int(article.get("rank"))
+    except (TypeError, ValueError):
+        rank = None
+    cleaned["rank"] = rank if rank is not None and 1 <= rank <= TOP_ARTICLES else None
+    if not isinstance(article.get("must_read"), bool):
+        cleaned["must_read"] = cleaned["rank"] is not None and cleaned["rank"] <= 2
+    return cleaned
+
+def validate_articles(items):
+    """
+    Keeps the valid articles of a reply (at most TOP_ARTICLES), ordered by rank.
+    Articles with a missing or out-of-range rank are placed after ranked ones and
+    ranks are renumbered 1..n. Prints how many items were dropped.
+    """
+    if not isinstance(items, list):
+        raise ValueError(f"Expected a list of articles, got {type(items).__name__}")
+    valid = [article for article in (validate_article(item) for item in items) if article is not None]
+    if len(valid) < len(items):
+        print(f"  - Dropped {len(items) - len(valid)} invalid articles from reply.")
+
+    # Stable sort keeps reply order among equally ranked articles
+    valid.sort(key=lambda a: a["rank"] if a["rank"] is not None else TOP_ARTICLES + 1)
+    top = valid[:TOP_ARTICLES]
+    for rank, article in enumerate(top, 1):
+        article["rank"] = rank
+    return top
@@ -0,0 +1,143 @@
+# Fix for Python 3.9 compatibility with Google libraries
+import sys
+try:
+    import importlib.metadata as stdlib_metadata
+    if not hasattr(stdlib_metadata, 'packages_distributions'):
+        import importlib_metadata
+        sys.modules['importlib.metadata'] = importlib_metadata
+except ImportError:
+    pass
+
+import os
+import time
+import argparse
+import threading
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from gmail_client import GmailClient
+from pipeline import NewsletterPipeline
+from run_journal import RunJournal
+from instrumentation import tracer
+
+def day_windows(since, until):
+    """
+    Yields every date from since to until, inclusive.
+    """
+    day = since
+    while day <= until:
+        yield day
+        day += timedelta(days=1)
+
+class Backfill:
+    """
+    Processes newsletters from a past date range, one day window at a time,
+    with up to `parallel_days` days in flight. Duplicate merging starts afresh
+    for each day, like a daily run, and each day gets its own daily summary
+    dated that day. Gemini and Notion rate limits are shared by all days,
+    so parallel days never exceed the normal request rates.
+    """
+    def __init__(self, gmail, llm, notion, journal=None, parallel_days=None):
+        self.gmail = gmail
+        self.llm = llm
+        self.notion = notion
+        self.journal = journal
+        self.parallel_days = parallel_days or int(os.environ.get("BACKFILL_PARALLEL_DAYS", 2))
+        # One pipeline per day thread, reused for the days that thread processes
+        self._local = threading.local()
+        self._pipelines = []
+        self._pipelines_lock = threading.Lock()
+
+    def run(self, since, until):
+        """
+        Backfills since..until (datetime.date, inclusive), printing progress and
+        an estimated completion time as days finish. Returns {day: newsletter count}.
+        """
+        days = list(day_windows(since, until))
+        counts = {}
+        start = time.perf_counter()
+        print(f"Backfilling {len(days)} days ({since} to {until}), {self.parallel_days} at a time...")
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.parallel_days, thread_name_prefix="day") as pool:
+                futures = {pool.submit(self._process_day, day): day for day in days}
+                for future in as_completed(futures):
+                    day = futures[future]
+                    try:
+                        counts[day] = future.result()
+                    except Exception as e:
+                        # Messages of a failed day stay unlabelled; rerunning the backfill picks them up
+                        print(f"[{day}] Failed: {e}")
+                        counts[day] = 0
+                    self._report_progress(day, counts, len(days), time.perf_counter() - start)
+        finally:
+            for pipeline in self._pipelines:
+                pipeline.close()
+
+        elapsed = time.perf_counter() - start
+        print(f"Backfill finished: {sum(counts.values())} newsletters over {len(days)} days in {elapsed:.0f}s.")
+        return dict(sorted(counts.items()))
+
+    def _process_day(self, day):
+        with tracer.span("backfill.day"):
+            pipeline = self._pipeline()
+            # Archive the day's articles under that day rather than today
+            pipeline.date = day
+            if pipeline.dedup:
+                pipeline.dedup.clear()
+            newsletters = pipeline.run(self.gmail.search_newsletters_between(day, day + timedelta(days=1)))
+            if newsletters:
+                print(f"[{day}] Creating Daily Summary Page ({len(newsletters)} newsletters)...")
+                page_id = self.notion.create_daily_summary(newsletters, date=day)
+                if page_id and self.journal:
+                    self.journal.record_summarized([newsletter['id'] for newsletter in newsletters])
+            return len(newsletters)
+
+    def _pipeline(self):
+        if not hasattr(self._local, "pipeline"):
+            self._local.pipeline = NewsletterPipeline(self.gmail, self.llm, self.notion, journal=self.journal)
+            with self._pipelines_lock:
+                self._pipelines.append(self._local.pipeline)
+        return self._local.pipeline
+
+    def _report_progress(self, day, counts, total_days, elapsed):
+        done = len(counts)
+        remaining = total_days - done
+        # Wall time per finished day already reflects the parallelism
+        eta = elapsed / done * remaining
+        finish = datetime.now() + timedelta(seconds=eta)
+        print(f"[{day}] {counts[day]} newsletters. Progress: {done}/{total_days} days, "
+              f"{sum(counts.values())} newsletters, {elapsed:.0f}s elapsed"
+              + (f", ETA {eta:.0f}s (~{finish:%H:%M})." if remaining else "."))
+
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+def main():
+    parser = argparse.ArgumentParser(description="Process newsletters from a past date range, one daily summary per day.")
+    parser.add_argument("--since", type=parse_date, required=True, help="first day, YYYY-MM-DD")
+    parser.add_argument("--until", type=parse_date, default=date.today(), help="last day, YYYY-MM-DD (default: today)")
+    parser.add_argument("--parallel", type=int, help="days processed at once (default: BACKFILL_PARALLEL_DAYS or 2)")
+    args = parser.parse_args()
+    if args.since > args.until:
+        parser.error("--since is after --until")
+
+    print("Starting Newsletter Digest Agent (backfill)...")
+    try:
+        # Imported here so argument errors don't pay for the Gemini and Notion clients
+        from notion_agent import NotionAgent
+        from llm_processor import LLMProcessor
+
+        gmail = GmailClient()
+        notion = NotionAgent()
+        llm = LLMProcessor()
+        journal = RunJournal() if os.environ.get("RUN_JOURNAL_ENABLED", "true").lower() == "true" else None
+    except Exception as e:
+        print(f"Initialization failed: {e}")
+        return
+
+    Backfill(gmail, llm, notion, journal=journal, parallel_days=args.parallel).run(args.since, args.until)
+    print(llm.token_stats())
+    tracer.report()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Micro-benchmark: streaming HTML extraction (html_text.html_to_text) vs the
+previous BeautifulSoup(..., 'html.parser').get_text() path.
+
+Corpus: a directory of saved newsletters, either .html files or .json files
+holding Gmail format='full' message resources. Populate it from your inbox with:
+
+    python benchmarks/bench_html_extraction.py --save 25
+
+then run:
+
+    python benchmarks/bench_html_extraction.py [--corpus DIR] [--repeat N]
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_text import html_to_text
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+def legacy_html_to_text(html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    return soup.get_text(separator='\n')
+
+def html_parts(payload):
+    """
+    Yields every decoded text/html part of a Gmail message payload.
+    """
+    for part in payload.get('parts', []):
+        yield from html_parts(part)
+    data = payload.get('body', {}).get('data')
+    if payload.get('mimeType') == 'text/html' and data:
+        yield base64.urlsafe_b64decode(data).decode("utf-8", errors="replace")
+
+def load_corpus(corpus_dir):
+    documents = []
+    for name in sorted(os.listdir(corpus_dir)):
+        path = os.path.join(corpus_dir, name)
+        if name.endswith(".html"):
+            with open(path, encoding="utf-8", errors="replace") as f:
+                documents.append(f.read())
+        elif name.endswith(".json"):
+            with open(path) as f:
+                documents.extend(html_parts(json.load(f)['payload']))
+    return documents
+
+def save_corpus(corpus_dir, count):
+    from gmail_client import GmailClient
+    client = GmailClient()
+    os.makedirs(corpus_dir, exist_ok=True)
+    saved = 0
+    for message in client.search_newsletters(limit=count):
+        msg = client.service.users().messages().get(userId="me", id=message['id'], format='full').execute()
+        with open(os.path.join(corpus_dir, f"{message['id']}.json"), "w") as f:
+            json.dump(msg, f)
+        saved += 1
+    print(f"Saved {saved} messages to {corpus_dir}")
+
+def bench(func, documents, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output_chars = sum(len(func(doc)) for doc in documents)
+        timings.append(time.perf_counter() - start)
+    return min(timings), output_chars
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", type=int, metavar="N", help="save N newsletters from Gmail into the corpus and exit")
+    args = parser.parse_args()
+
+    if args.save:
+        save_corpus(args.corpus, args.save)
+        return
+
+    if not os.path.isdir(args.corpus):
+        print(f"Corpus directory {args.corpus} not found. Run with --save N first.")
+        return
+    documents = load_corpus(args.corpus)
+    if not documents:
+        print(f"No HTML documents found in {args.corpus}.")
+        return
+
+    input_chars = sum(len(doc) for doc in documents)
+    print(f"Corpus: {len(documents)} HTML documents, {input_chars / 1024:.0f} KiB")
+
+    results = [("streaming html.parser", html_to_text)]
+    try:
+        import bs4  # noqa: F401
+        results.append(("BeautifulSoup (legacy)", legacy_html_to_text))
+    except ImportError:
+        print("beautifulsoup4 not installed; skipping legacy comparison.")
+
+    baseline = None
+    for label, func in results:
+        seconds, output_chars = bench(func, documents, args.repeat)
+        per_doc_ms = seconds / len(documents) * 1000
+        baseline = baseline or seconds
+        print(f"{label:<24} {seconds * 1000:8.1f} ms total  {per_doc_ms:6.2f} ms/doc  "
+              f"{output_chars / 1024:6.0f} KiB text  ({seconds / baseline:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Offline end-to-end benchmark of main.main().
+
+Runs the real agent against local stand-ins for Gmail, Gemini and Notion
+(see fake_services.py) with configurable latency, error rate and rate limits,
+over a synthetic corpus of newsletters. Reports wall time, API call counts
+and peak memory, so pipeline changes can be measured without network access.
+
+    python benchmarks/bench_pipeline.py --newsletters 60 --llm-latency 1.0
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--newsletters", type=int, default=20, help="size of the synthetic corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--gmail-latency", type=float, default=0.05, help="seconds per Gmail call")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="base seconds per Gemini call")
+    parser.add_argument("--notion-latency", type=float, default=0.1, help="seconds per Notion call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a transient error per call")
+    parser.add_argument("--gmail-rps", type=float, default=None, help="Gmail requests/second before 429s")
+    parser.add_argument("--llm-rps", type=float, default=None, help="Gemini requests/second before quota errors")
+    parser.add_argument("--notion-rps", type=float, default=3, help="Notion requests/second before 429s")
+    parser.add_argument("--tracemalloc", action="store_true", help="measure peak Python heap (slower)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra agent settings, e.g. --env LLM_BATCH_MODE=true")
+    return parser.parse_args(argv)
+
+def configure_environment(args, workdir):
+    """
+    Points every piece of local state (caches, journal, indexes, traces) at a
+    scratch directory and disables anything that would make runs non-repeatable.
+    Must run before the agent modules are imported, since some read settings at import.
+    """
+    os.chdir(workdir)
+    os.environ.update({
+        "NOTION_API_KEY": "fake",
+        "NOTION_ARTICLES_DB_ID": "fake-articles-db",
+        "NOTION_SUMMARY_DB_ID": "fake-summary-db",
+        "LLM_CACHE_ENABLED": "false",
+        "GMAIL_INCREMENTAL_SYNC": "false",
+        "RUN_TRACE_FILE": os.path.join(workdir, "run_trace.jsonl"),
+        "LLM_BACKOFF_BASE_SECONDS": "0.2",
+    })
+    for setting in args.env:
+        key, _, value = setting.partition("=")
+        os.environ[key] = value
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="newsletter-bench-")
+    configure_environment(args, workdir)
+
+    from fake_services import (ServiceModel, FakeGmailService, FakeGeminiModel,
+                               FakeNotionClient, synthetic_corpus)
+    import main as agent
+    from gmail_client import GmailClient
+    from llm_processor import LLMProcessor
+    from notion_agent import NotionAgent
+
+    corpus = synthetic_corpus(args.newsletters, seed=args.seed)
+    gmail_model = ServiceModel("gmail", args.gmail_latency, args.error_rate, args.gmail_rps, seed=args.seed)
+    llm_model = ServiceModel("gemini", args.llm_latency, args.error_rate, args.llm_rps, seed=args.seed + 1)
+    notion_model = ServiceModel("notion", args.notion_latency, args.error_rate, args.notion_rps, seed=args.seed + 2)
+
+    gmail_service = FakeGmailService(corpus, gmail_model)
+    notion_client = FakeNotionClient(notion_model)
+
+    # Inject the fakes wherever main() builds its clients
+    agent.GmailClient = lambda: GmailClient(service=gmail_service)
+    gemini = FakeGeminiModel(llm_model)
+    agent.LLMProcessor = lambda: LLMProcessor(model=gemini)
+    agent.NotionAgent = lambda: NotionAgent(client=notion_client)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    start = time.perf_counter()
+    agent.main()
+    wall = time.perf_counter() - start
+    heap_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024) if args.tracemalloc else None
+
+    print("\n=== Benchmark Results ===")
+    print(f"Newsletters: {args.newsletters}   wall time: {wall:.2f}s   throughput: {args.newsletters / wall:.2f} newsletters/s")
+    for model in (gmail_model, llm_model, notion_model):
+        total = sum(count for api, count in model.calls.items() if "(in batch)" not in api)
+        print(f"{model.name:<7} {total:5d} HTTP calls  " + ", ".join(f"{api}={n}" for api, n in sorted(model.calls.items())))
+        if model.errors:
+            print(f"{'':<7} errors: " + ", ".join(f"{api}={n}" for api, n in sorted(model.errors.items())))
+    print(f"Notion pages created: {notion_client.pages_created}, blocks written: {notion_client.blocks_written}")
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"Peak RSS: {rss:.1f} MiB")
+    if heap_peak is not None:
+        print(f"Peak Python heap (tracemalloc): {heap_peak:.1f} MiB")
+    print(f"Scratch directory: {workdir}")
+
+    # One page per distinct article the LLM returned, plus the daily summary
+    article_pages = notion_client.pages_by_database["fake-articles-db"]
+    summary_pages = notion_client.pages_by_database["fake-summary-db"]
+    assert article_pages == len(gemini.extracted_urls), \
+        f"expected {len(gemini.extracted_urls)} article pages, created {article_pages}"
+    assert summary_pages == 1, f"expected 1 summary page, created {summary_pages}"
+    return wall
+
+if __name__ == "__main__":
+    run(parse_args())
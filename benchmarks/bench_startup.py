@@ -0,0 +1,148 @@
+"""
+Cold-start benchmark for the no-work path (no new newsletters).
+
+1. Import profile: runs `python -X importtime -c "import main"` and lists the
+   slowest modules, so a heavy import creeping back into module scope shows up.
+2. No-work run: starts a fresh interpreter that runs main.main() against an
+   empty stand-in mailbox and times the whole process. Exits non-zero when it
+   takes longer than --target-ms.
+3. Gmail service build: build() vs build_from_document() on the cached
+   discovery document (needs google-api-python-client).
+
+    python benchmarks/bench_startup.py --target-ms 1500
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+# Runs in the child interpreter; only stdlib and the agent itself are imported
+NO_WORK_DRIVER = f"""
+import sys
+sys.path[:0] = [{REPO_DIR!r}, {BENCH_DIR!r}]
+import main
+from bench_startup import EmptyGmailService
+from gmail_client import GmailClient
+main.GmailClient = lambda: GmailClient(service=EmptyGmailService())
+main.main()
+"""
+
+class EmptyRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+class EmptyGmailService:
+    """
+    Gmail service stand-in for a mailbox with nothing to process.
+    """
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def list(self, **kwargs):
+        return EmptyRequest({"resultSizeEstimate": 0})
+
+    def getProfile(self, userId):
+        return EmptyRequest({"historyId": "1"})
+
+def parse_importtime(stderr):
+    """
+    Parses -X importtime output into (module, self_us, cumulative_us) tuples.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((module.rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def profile_imports(top):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=REPO_DIR, capture_output=True, text=True)
+    rows = parse_importtime(result.stderr)
+    main_row = next((row for row in rows if row[0].strip() == "main"), None)
+    print("=== Import profile (python -X importtime -c 'import main') ===")
+    if result.returncode != 0 or main_row is None:
+        print(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import main failed")
+        return None
+    print(f"import main: {main_row[2] / 1000:.1f} ms cumulative")
+    print(f"{'module':<50}{'self ms':>10}{'cumul. ms':>11}")
+    for module, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[1:top + 1]:
+        print(f"{module[:50]:<50}{self_us / 1000:>10.1f}{cumulative_us / 1000:>11.1f}")
+    return main_row[2] / 1000
+
+def time_no_work_run(repeat):
+    """
+    Wall time of a fresh interpreter running main.main() with nothing to do (best of `repeat`).
+    """
+    workdir = tempfile.mkdtemp(prefix="newsletter-startup-")
+    env = dict(os.environ, GMAIL_INCREMENTAL_SYNC="false", RUN_TRACE_FILE="",
+               RUN_JOURNAL_PATH=os.path.join(workdir, "run_journal.sqlite3"))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", NO_WORK_DRIVER], cwd=workdir, env=env,
+                                capture_output=True, text=True)
+        timings.append((time.perf_counter() - start) * 1000)
+        if result.returncode != 0 or "No new newsletters found." not in result.stdout:
+            print(result.stdout + result.stderr)
+            raise SystemExit("No-work run failed.")
+    return min(timings)
+
+def time_service_build(repeat):
+    try:
+        from google.auth.credentials import AnonymousCredentials
+        from googleapiclient.discovery import build, build_from_document
+    except ImportError:
+        print("google-api-python-client not installed; skipping service build timing.")
+        return
+    sys.path.insert(0, REPO_DIR)
+    os.chdir(tempfile.mkdtemp(prefix="newsletter-discovery-"))
+    from gmail_client import discovery_document
+
+    creds = AnonymousCredentials()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        build("gmail", "v1", credentials=creds)
+    built = (time.perf_counter() - start) * 1000 / repeat
+
+    discovery_document()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        build_from_document(discovery_document(), credentials=creds)
+    cached = (time.perf_counter() - start) * 1000 / repeat
+
+    print("\n=== Gmail service build ===")
+    print(f"build('gmail', 'v1'):                 {built:.1f} ms per service")
+    print(f"build_from_document(cached document): {cached:.1f} ms per service")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=1500, help="budget for the no-work run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    args = parser.parse_args(argv)
+
+    profile_imports(args.top)
+    no_work_ms = time_no_work_run(args.repeat)
+    time_service_build(args.repeat)
+
+    print(f"\nNo-work run (best of {args.repeat}): {no_work_ms:.0f} ms (target {args.target_ms:.0f} ms)")
+    if no_work_ms > args.target_ms:
+        print("Over target.")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Daily summary layout benchmark.
+
+Builds a synthetic day of processed newsletters and, for each summary layout
+(full, compact, category), prints the estimated block count, payload size and
+Notion requests, then writes the summary through create_daily_summary against
+the simulated Notion API to confirm the request count and measure wall time.
+Also shows which layout NOTION_SUMMARY_LAYOUT=auto would pick.
+
+    python benchmarks/bench_summary_layout.py --newsletters 60 --notion-latency 0.3
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+def synthetic_day(count, seed=0, min_articles=3, max_articles=8, duplicate_rate=0.1):
+    """
+    Processed newsletters as the pipeline hands them to create_daily_summary,
+    with a share of articles merged into an earlier newsletter's copy.
+    """
+    from fake_services import TOPICS
+
+    rng = random.Random(seed)
+    words = ["model", "launch", "policy", "latency", "budget", "patient", "design", "grid", "agent", "release"]
+    sentence = lambda n: " ".join(rng.choice(words) for _ in range(n)).capitalize() + "."
+    newsletters = []
+    published = []
+    for i in range(count):
+        name = f"Newsletter {i % 17}"
+        articles = []
+        for a in range(rng.randint(min_articles, max_articles)):
+            if published and rng.random() < duplicate_rate:
+                primary = rng.choice(published)
+                primary.setdefault("sources", [primary["newsletter_name"]]).append(name)
+                articles.append({"title": primary["title"], "url": primary["url"], "duplicate_of": {
+                    "title": primary["title"], "url": primary["url"], "newsletter_name": primary["newsletter_name"]}})
+                continue
+            article = {
+                "title": f"{rng.choice(TOPICS)} story {i}-{a}",
+                "url": f"https://news{i % 17}.example.org/{i}-{a}",
+                "summary": " ".join(sentence(rng.randint(8, 20)) for _ in range(rng.randint(2, 4))),
+                "takeaways": [sentence(rng.randint(6, 14)) for _ in range(rng.randint(2, 5))],
+                "category": rng.choice(TOPICS),
+                "must_read": rng.random() < 0.2,
+                "newsletter_name": name,
+                "notion_id": f"00000000-0000-0000-0000-{i:06d}{a:06d}",
+            }
+            articles.append(article)
+            published.append(article)
+        newsletters.append({"id": f"msg{i:05d}", "name": name, "subject": f"Issue #{i}", "articles": articles})
+    return newsletters
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--newsletters", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--notion-latency", type=float, default=0.3, help="seconds per Notion call")
+    parser.add_argument("--notion-rps", type=float, default=3, help="Notion requests/second before 429s")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="newsletter-bench-"))
+    os.environ.update({"NOTION_API_KEY": "fake", "NOTION_ARTICLES_DB_ID": "fake-articles-db",
+                       "NOTION_SUMMARY_DB_ID": "fake-summary-db", "RUN_TRACE_FILE": os.path.join(os.getcwd(), "run_trace.jsonl")})
+
+    from fake_services import ServiceModel, FakeNotionClient
+    from notion_agent import NotionAgent
+    from summary_layout import LAYOUTS, estimate, choose_layout
+
+    newsletters = synthetic_day(args.newsletters, seed=args.seed)
+    articles = sum(len(newsletter["articles"]) for newsletter in newsletters)
+    print(f"{args.newsletters} newsletters, {articles} articles\n")
+    print(f"{'layout':<10} {'blocks':>7} {'top-level':>10} {'KB':>7} {'est. req':>9} {'actual req':>11} {'wall s':>7}")
+    for layout in LAYOUTS:
+        cost = estimate(newsletters, layout)
+        model = ServiceModel("notion", args.notion_latency, rate_limit=args.notion_rps, seed=args.seed)
+        os.environ["NOTION_SUMMARY_LAYOUT"] = layout
+        start = time.perf_counter()
+        NotionAgent(client=FakeNotionClient(model)).create_daily_summary(newsletters)
+        wall = time.perf_counter() - start
+        # Successful calls only; throttled attempts are retried by the agent
+        actual = sum(model.calls.values()) - sum(model.errors.values())
+        print(f"{layout:<10} {cost['blocks']:>7} {cost['top_level_blocks']:>10} {cost['bytes'] / 1024:>7.0f} "
+              f"{cost['requests']:>9} {actual:>11} {wall:>7.2f}")
+
+    os.environ["NOTION_SUMMARY_LAYOUT"] = "auto"
+    print(f"\nauto picks: {choose_layout(newsletters)[0]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+Local stand-ins for the Gmail, Gemini and Notion APIs used by the benchmarks.
+
+Each fake mimics the slice of the client library the agent calls, with
+configurable per-call latency, random error rate and a requests-per-second
+limit that triggers the same 429-style errors the real services return.
+"""
+import re
+import json
+import time
+import base64
+import random
+import threading
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+from email.utils import format_datetime
+from collections import Counter, deque
+
+import httpx
+import httplib2
+from googleapiclient.errors import HttpError
+from google.api_core import exceptions as google_exceptions
+from notion_client import APIResponseError
+
+class ServiceModel:
+    """
+    Latency, error and rate-limit behaviour shared by the fakes.
+    """
+    def __init__(self, name, latency, error_rate=0.0, rate_limit=None, seed=None):
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.calls = Counter()
+        self.errors = Counter()
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    def roll_error(self):
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def call(self, api, throttled, failed, extra_latency=0.0):
+        """
+        Accounts for one API call; sleeps for the simulated latency and raises
+        throttled() / failed() when the rate limit or error rate is hit.
+        """
+        with self._lock:
+            self.calls[api] += 1
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            over_limit = self.rate_limit is not None and len(self._recent) >= self.rate_limit
+            if not over_limit:
+                self._recent.append(now)
+            jitter = self._rng.uniform(0.5, 1.5)
+            fail = self._rng.random() < self.error_rate
+
+        if over_limit:
+            self.errors[f"{api} (throttled)"] += 1
+            raise throttled()
+        time.sleep((self.latency + extra_latency) * jitter)
+        if fail:
+            self.errors[api] += 1
+            raise failed()
+
+def http_error(status):
+    return HttpError(httplib2.Response({"status": status}), b"", uri="fake://gmail")
+
+def notion_error(status, retry_after=None):
+    headers = httpx.Headers({"retry-after": str(retry_after)} if retry_after else {})
+    code = "rate_limited" if status == 429 else "service_unavailable"
+    message = f"Fake Notion {status}"
+    body = json.dumps({"object": "error", "status": status, "code": code, "message": message})
+    return APIResponseError(code, status, message, headers, body)
+
+# --- Synthetic corpus ---
+
+TOPICS = ["AI", "Healthcare", "Product", "Engineering", "Business", "Security", "Design", "Climate"]
+FOOTER = (
+    "You are receiving this email because you subscribed to our newsletter.\n"
+    "Unsubscribe | Manage preferences | View in browser\n"
+    "© 2025 Example Media Inc. All rights reserved."
+)
+
+def synthetic_corpus(count, seed=0, min_articles=3, max_articles=12, start=None, spacing_hours=6):
+    """
+    Builds `count` Gmail format='full' message resources of varying size.
+    Roughly half are HTML-only, the rest multipart/alternative with plain text.
+    Messages are received every `spacing_hours` from `start` (a datetime, default 2024-01-01).
+    """
+    start = start or datetime(2024, 1, 1)
+    rng = random.Random(seed)
+    syllables = ["ba", "ko", "ri", "tem", "lu", "sen", "da", "vor", "mi", "pel", "qua", "zin", "to", "gar", "fe", "nos"]
+    vocabulary = list({"".join(rng.choice(syllables) for _ in range(rng.randint(2, 3))) for _ in range(600)})
+    messages = []
+    for i in range(count):
+        received = start + timedelta(hours=i * spacing_hours)
+        sender = f"Newsletter {i % 17}"
+        articles = []
+        for a in range(rng.randint(min_articles, max_articles)):
+            topic = rng.choice(TOPICS)
+            words = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(40, 400)))
+            url = f"https://news{i % 17}.example.org/{topic.lower()}/{i}-{a}?utm_source=newsletter&utm_medium=email"
+            articles.append((f"{topic} story {i}-{a}", url, words))
+
+        html = "<html><head><style>.x{color:#333}</style></head><body><table>" + "".join(
+            f'<tr><td><h2><a href="{url}">{title}</a></h2><p>{words}</p></td></tr>' for title, url, words in articles
+        ) + f"</table><div style=\"display:none\">preheader</div><p>{FOOTER}</p></body></html>"
+        plain = "\n\n".join(f"{title}\n{url}\n{words}" for title, url, words in articles) + "\n\n" + FOOTER
+
+        encode = lambda text: base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")
+        if i % 2:
+            payload = {"mimeType": "text/html", "headers": [], "body": {"data": encode(html)}}
+        else:
+            payload = {"mimeType": "multipart/alternative", "parts": [
+                {"mimeType": "text/plain", "headers": [], "body": {"data": encode(plain)}},
+                {"mimeType": "text/html", "headers": [], "body": {"data": encode(html)}},
+            ]}
+        payload["headers"] = [
+            {"name": "Subject", "value": f"Issue #{i}: {articles[0][0]}"},
+            {"name": "From", "value": f'"{sender}" <news{i % 17}@example.org>'},
+            {"name": "Date", "value": format_datetime(received)},
+        ]
+        messages.append({"id": f"msg{i:05d}", "threadId": f"thr{i:05d}", "labelIds": ["L_newsletter"],
+                         "internalDate": str(int(received.timestamp() * 1000)),
+                         "sizeEstimate": len(html) + len(plain), "payload": payload})
+    return messages
+
+# --- Gmail ---
+
+class FakeRequest:
+    def __init__(self, gmail, api, func):
+        self.gmail = gmail
+        self.api = api
+        self.func = func
+
+    def execute(self):
+        self.gmail.model.call(self.api, lambda: http_error(429), lambda: http_error(503))
+        return self.func()
+
+class FakeBatch:
+    def __init__(self, gmail, callback):
+        self.gmail = gmail
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        # One HTTP round trip for the whole batch; sub-requests can still fail individually
+        self.gmail.model.call("batch", lambda: http_error(429), lambda: http_error(503))
+        for request_id, request in self.requests:
+            self.gmail.model.calls[f"{request.api} (in batch)"] += 1
+            if self.gmail.model.roll_error():
+                self.callback(request_id, None, http_error(503))
+            else:
+                self.callback(request_id, request.func(), None)
+
+class FakeGmailService:
+    """
+    Stand-in for googleapiclient's Gmail v1 service over a synthetic mailbox.
+    """
+    def __init__(self, messages, model):
+        self.model = model
+        self.messages_by_id = {m["id"]: m for m in messages}
+        self.order = [m["id"] for m in messages]
+        self.label_names = {"L_newsletter": "newsletter"}
+        self._lock = threading.Lock()
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return SimpleNamespace(
+            list=self._list, get=self._get, modify=self._modify, batchModify=self._batch_modify
+        )
+
+    def labels(self):
+        return SimpleNamespace(
+            list=lambda userId: FakeRequest(self, "labels.list", lambda: {
+                "labels": [{"id": i, "name": n} for i, n in self.label_names.items()]}),
+            create=lambda userId, body: FakeRequest(self, "labels.create", lambda: self._create_label(body["name"])),
+        )
+
+    def history(self):
+        return SimpleNamespace(list=lambda **kwargs: FakeRequest(self, "history.list", lambda: {"historyId": "1"}))
+
+    def getProfile(self, userId):
+        return FakeRequest(self, "getProfile", lambda: {"historyId": "1"})
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    def _create_label(self, name):
+        with self._lock:
+            label_id = f"L_{len(self.label_names)}"
+            self.label_names[label_id] = name
+        return {"id": label_id, "name": name}
+
+    def _list(self, userId, q="", maxResults=100, pageToken=None):
+        def page():
+            excluded = {i for i, n in self.label_names.items() if f'-label:"{n}"' in q}
+            # after:/before: take epoch seconds; date forms aren't simulated
+            after = re.search(r"after:(\d+)\b", q)
+            before = re.search(r"before:(\d+)\b", q)
+            ids = [i for i in self.order if not excluded & set(self.messages_by_id[i]["labelIds"])
+                   and (not after or int(self.messages_by_id[i]["internalDate"]) >= int(after.group(1)) * 1000)
+                   and (not before or int(self.messages_by_id[i]["internalDate"]) < int(before.group(1)) * 1000)]
+            start = int(pageToken or 0)
+            result = {"messages": [{"id": i, "threadId": self.messages_by_id[i]["threadId"]}
+                                   for i in ids[start:start + maxResults]]}
+            if start + maxResults < len(ids):
+                result["nextPageToken"] = str(start + maxResults)
+            return result
+        return FakeRequest(self, "messages.list", page)
+
+    def _get(self, userId, id, format="full", metadataHeaders=None):
+        def get():
+            message = dict(self.messages_by_id[id])
+            if format == "metadata":
+                message["payload"] = {"headers": message["payload"]["headers"]}
+            return message
+        return FakeRequest(self, "messages.get", get)
+
+    def _apply_labels(self, ids, body):
+        with self._lock:
+            for msg_id in ids:
+                labels = self.messages_by_id[msg_id]["labelIds"]
+                labels.extend(l for l in body.get("addLabelIds", []) if l not in labels)
+                for label in body.get("removeLabelIds", []):
+                    if label in labels:
+                        labels.remove(label)
+        return {}
+
+    def _modify(self, userId, id, body):
+        return FakeRequest(self, "messages.modify", lambda: self._apply_labels([id], body))
+
+    def _batch_modify(self, userId, body):
+        return FakeRequest(self, "messages.batchModify", lambda: self._apply_labels(body["ids"], body))
+
+# --- Gemini ---
+
+URL_IN_TEXT = re.compile(r"https?://[^\s)\"'<>]+")
+
+class FakeGeminiModel:
+    """
+    Stand-in for genai.GenerativeModel: "extracts" the first links it finds.
+    Latency grows with prompt size.
+    """
+    def __init__(self, model, seconds_per_1k_tokens=0.05):
+        self.model = model
+        self.seconds_per_1k_tokens = seconds_per_1k_tokens
+        # Every article URL handed back, to check what ends up in Notion
+        self.extracted_urls = set()
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, generation_config=None):
+        prompt_tokens = len(prompt) // 4
+        self.model.call(
+            "generate_content",
+            lambda: google_exceptions.ResourceExhausted("Fake quota exceeded"),
+            lambda: google_exceptions.ServiceUnavailable("Fake overload"),
+            extra_latency=prompt_tokens / 1000 * self.seconds_per_1k_tokens,
+        )
+
+        sections = re.split(r"=== NEWSLETTER id=(\S+) ===", prompt)
+        if len(sections) > 1:
+            result = [{"newsletter_id": sections[i], "articles": self._articles(sections[i + 1])}
+                      for i in range(1, len(sections) - 1, 2)]
+        else:
+            result = self._articles(prompt)
+        text = json.dumps(result)
+        usage = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=len(text) // 4)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def _articles(self, text):
+        urls = list(dict.fromkeys(u for u in URL_IN_TEXT.findall(text) if "example.org" in u))[:5]
+        # The "summary" is the text right after the link
+        following = {url: " ".join(text[text.find(url) + len(url):].split()[:40]) for url in urls}
+        with self._lock:
+            self.extracted_urls.update(urls)
+        return [{
+            "title": f"Article {url.rsplit('/', 1)[-1]}",
+            "url": url,
+            "summary": following[url] + ".",
+            "takeaways": [f"Takeaway {n}" for n in range(1, 4)],
+            "category": "Engineering",
+            "must_read": rank <= 2,
+            "rank": rank,
+        } for rank, url in enumerate(urls, 1)]
+
+# --- Notion ---
+
+class PagesEndpoint:
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, parent, properties, children=None):
+        self.client._call("pages.create")
+        with self.client._lock:
+            self.client.pages_created += 1
+            self.client.pages_by_database[parent.get("database_id")] += 1
+            self.client.blocks_written += len(children or [])
+            return {"id": f"00000000-0000-0000-0000-{self.client.pages_created:012d}"}
+
+    def update(self, page_id, properties):
+        self.client._call("pages.update")
+        return {"id": page_id}
+
+class BlocksChildrenEndpoint:
+    def __init__(self, client):
+        self.client = client
+
+    def append(self, block_id, children):
+        self.client._call("blocks.children.append")
+        with self.client._lock:
+            self.client.blocks_written += len(children)
+        return {}
+
+class DatabasesEndpoint:
+    def __init__(self, client):
+        self.client = client
+
+    def query(self, database_id, page_size=100, start_cursor=None, **kwargs):
+        self.client._call("databases.query")
+        return {"results": [], "has_more": False, "next_cursor": None}
+
+class FakeNotionClient:
+    """
+    Stand-in for notion_client.Client (pages, blocks.children, databases).
+    Endpoint class names match notion-client so trace span names line up.
+    """
+    def __init__(self, model):
+        self.model = model
+        self.pages_created = 0
+        self.pages_by_database = Counter()
+        self.blocks_written = 0
+        self._lock = threading.Lock()
+        self.pages = PagesEndpoint(self)
+        self.blocks = SimpleNamespace(children=BlocksChildrenEndpoint(self))
+        self.databases = DatabasesEndpoint(self)
+
+    def _call(self, api):
+        self.model.call(api, lambda: notion_error(429, retry_after=1), lambda: notion_error(503))
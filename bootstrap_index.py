@@ -0,0 +1,11 @@
+import sys
+from notion_agent import NotionAgent
+
+def bootstrap_index():
+    # Pass --rebuild to drop the local index before reloading it from Notion
+    rebuild = "--rebuild" in sys.argv
+    notion = NotionAgent()
+    notion.bootstrap_index(rebuild=rebuild)
+
+if __name__ == "__main__":
+    bootstrap_index()
@@ -0,0 +1,174 @@
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters added by email/marketing platforms purely for tracking
+TRACKING_PARAMS = {
+    "mc_cid", "mc_eid", "_hsenc", "_hsmi", "mkt_tok", "fbclid", "gclid", "dclid",
+    "yclid", "msclkid", "oly_anon_id", "oly_enc_id", "vero_id", "rb_clickid", "s_cid",
+    "ck_subscriber_id", "sc_channel", "__s", "ref_src",
+}
+TRACKING_PREFIXES = ("utm_", "pk_", "hsa_")
+
+# Click-through wrappers that carry the destination in a query parameter:
+# (host or parent domain, required path or None, parameter)
+REDIRECT_WRAPPERS = [
+    ("google.com", "/url", "q"),
+    ("youtube.com", "/redirect", "q"),
+    ("l.facebook.com", "/l.php", "u"),
+    ("lm.facebook.com", "/l.php", "u"),
+    ("out.reddit.com", None, "url"),
+    ("safelinks.protection.outlook.com", None, "url"),
+    ("slack-redir.net", "/link", "url"),
+]
+# Proofpoint URL Defense v3: https://urldefense.com/v3/__<url>__;...
+URLDEFENSE_V3 = re.compile(r"^https?://urldefense\.com/v3/__(.+?)__;")
+
+# Footer lines (unsubscribe, copyright, ...); only dropped near the end of the email.
+# Words article text also uses (unsubscribe, privacy policy) only count at the start
+# of a line or of a "Link | Link" item
+BOILERPLATE_LINE = re.compile(
+    r"((^|[|•·])\W*(click here )?(to )?unsubscribe|view (this )?(email|newsletter|message)? ?(in|on) (your |a )?(browser|web)|"
+    r"manage (your )?(email )?(preferences|subscription)|update your preferences|"
+    r"you('re| are) receiving this|this email was sent to|forward(ed)? (this )?to a friend|"
+    r"add us to your address book|all rights reserved|^\s*(copyright|©)|(^|[|•·])\W*privacy policy|"
+    r"no longer wish to receive)",
+    re.IGNORECASE
+)
+# Short lines that open a footer ("Unsubscribe", "You are receiving this because ...");
+# everything from them on is dropped. Article sentences merely mentioning the words don't match.
+FOOTER_MARKER = re.compile(
+    r"^\W*((click here )?to unsubscribe|unsubscribe\b|you('re| are) receiving this|this email was sent to|"
+    r"(if )?you no longer wish to receive)",
+    re.IGNORECASE
+)
+FOOTER_MARKER_MAX_CHARS = 160
+# The footer is only looked for in the last FOOTER_LINES lines (or the last quarter, if shorter)
+FOOTER_LINES = 15
+
+URL_PATTERN = re.compile(r"https?://[^\s<>()\"']+")
+INVISIBLE_CHARS = re.compile("[\u200b\u200c\u200d\u2060\ufeff\u034f\u00ad]")
+
+def estimate_tokens(text):
+    """
+    Rough token count (~4 characters per token for English text).
+    """
+    return len(text or "") // 4
+
+def is_tracking_param(key):
+    key = key.lower()
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES)
+
+def strip_tracking_params(url):
+    """
+    Removes tracking query parameters from a URL and keeps everything else,
+    including the fragment (it can address the article, e.g. #/article/5).
+    URLs without tracking parameters are returned unchanged.
+    """
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    params = parse_qsl(parts.query, keep_blank_values=True)
+    query = [(key, value) for key, value in params if not is_tracking_param(key)]
+    if len(query) == len(params):
+        return url
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), parts.fragment))
+
+def canonicalize_url(url):
+    """
+    Removes tracking query parameters and fragments from a URL.
+    Only for building comparison keys; use strip_tracking_params for links that are kept.
+    """
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if not is_tracking_param(key)]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+def unwrap_redirect(url):
+    """
+    Returns the destination of a known click-through redirect wrapper
+    (Google, Facebook, Outlook Safe Links, URL Defense, ...), or the URL unchanged.
+    Opaque tracking links (e.g. per-subscriber click ids) can't be resolved offline and are left as is.
+    """
+    for _ in range(3):
+        match = URLDEFENSE_V3.match(url)
+        if match:
+            url = match.group(1)
+            continue
+        try:
+            parts = urlsplit(url)
+        except ValueError:
+            return url
+        host = parts.netloc.lower()
+        for domain, path, param in REDIRECT_WRAPPERS:
+            if (host == domain or host.endswith("." + domain)) and path in (None, parts.path):
+                target = dict(parse_qsl(parts.query)).get(param, "")
+                break
+        else:
+            return url
+        if not target.startswith(("http://", "https://")):
+            return url
+        url = target
+    return url
+
+def footer_start(lines):
+    """
+    Index of the first line of the trailing region footers are looked for in.
+    """
+    return max(int(len(lines) * 0.75), len(lines) - FOOTER_LINES)
+
+def clean_body(text):
+    """
+    Strips newsletter boilerplate before it is sent to the LLM:
+    invisible padding characters, tracking parameters on links,
+    unsubscribe/footer blocks and redundant whitespace.
+    """
+    if not text:
+        return ""
+
+    text = INVISIBLE_CHARS.sub("", text).replace("\xa0", " ")
+    # Gemini copies these links into Notion, so only tracking parameters are removed
+    text = URL_PATTERN.sub(lambda m: strip_tracking_params(unwrap_redirect(m.group(0))), text)
+
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.splitlines()]
+
+    # Cut the footer at the first footer-opening line in the trailing footer region
+    for i in range(footer_start(lines), len(lines)):
+        if len(lines[i]) <= FOOTER_MARKER_MAX_CHARS and FOOTER_MARKER.search(lines[i]):
+            lines = lines[:i]
+            break
+
+    # Drop leftover boilerplate lines in the same region only
+    tail_start = footer_start(lines)
+    lines = lines[:tail_start] + [line for line in lines[tail_start:] if not BOILERPLATE_LINE.search(line)]
+
+    text = "\n".join(lines)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+def split_sections(text, max_tokens):
+    """
+    Splits text into sections of at most max_tokens, breaking on paragraph
+    boundaries where possible so articles aren't cut in half.
+    """
+    max_chars = max_tokens * 4
+    sections = []
+    current = ""
+    for paragraph in text.split("\n\n"):
+        # Hard-split paragraphs that are bigger than a whole section on their own
+        while len(paragraph) > max_chars:
+            if current:
+                sections.append(current)
+                current = ""
+            sections.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            sections.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        sections.append(current)
+    return sections
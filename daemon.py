@@ -0,0 +1,171 @@
+# Fix for Python 3.9 compatibility with Google libraries
+import sys
+try:
+    import importlib.metadata as stdlib_metadata
+    if not hasattr(stdlib_metadata, 'packages_distributions'):
+        import importlib_metadata
+        sys.modules['importlib.metadata'] = importlib_metadata
+except ImportError:
+    pass
+
+import os
+import json
+import signal
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from gmail_client import GmailClient
+from notion_agent import NotionAgent
+from llm_processor import LLMProcessor
+from pipeline import NewsletterPipeline
+from run_journal import RunJournal
+from instrumentation import tracer
+
+class NewsletterDaemon:
+    """
+    Resident alternative to the once-a-day main.py run.
+    Keeps the Gmail, Gemini and Notion clients warm, processes newsletters as
+    they arrive (polling Gmail history, or woken early by a push notification
+    on the optional webhook) and writes the daily summary at a fixed time.
+    """
+    def __init__(self, gmail, llm, notion, journal=None):
+        self.gmail = gmail
+        self.llm = llm
+        self.notion = notion
+        self.journal = journal
+        self.pipeline = NewsletterPipeline(gmail, llm, notion, journal=journal)
+
+        self.poll_seconds = float(os.environ.get("DAEMON_POLL_SECONDS", 60))
+        self.summary_time = os.environ.get("DAEMON_SUMMARY_TIME", "08:00")
+        webhook_port = os.environ.get("DAEMON_WEBHOOK_PORT")
+        self.webhook_port = int(webhook_port) if webhook_port else None
+
+        # Without a journal, newsletters waiting for the next summary only live in memory
+        self._unsummarized = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._server = None
+        self.next_summary = self._next_summary_after(datetime.now())
+
+    def run(self):
+        """
+        Polls until stopped (SIGINT/SIGTERM), then writes any pending summary.
+        """
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        if self.webhook_port:
+            self._start_webhook()
+
+        print(f"Daemon started: polling every {self.poll_seconds:.0f}s, "
+              f"daily summary at {self.next_summary:%Y-%m-%d %H:%M}.")
+        while not self._stop.is_set():
+            try:
+                self.poll()
+                if datetime.now() >= self.next_summary:
+                    self.flush_summary()
+            except Exception as e:
+                # Keep the service alive; the next poll retries anything left unlabelled
+                print(f"Daemon cycle failed: {e}")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+        if self._server:
+            self._server.shutdown()
+        self.pipeline.close()
+        print("Daemon stopping.")
+
+    def stop(self, *args):
+        self._stop.set()
+        self._wake.set()
+
+    def poll(self):
+        """
+        Processes newsletters added since the last poll (incremental history sync).
+        Returns the processed newsletters.
+        """
+        newsletters = self.pipeline.run(self.gmail.search_newsletters(incremental=True))
+        self.gmail.save_sync_state()
+        if newsletters:
+            print(f"Processed {len(newsletters)} new newsletters.")
+            if not self.journal:
+                self._unsummarized.extend(newsletters)
+        return newsletters
+
+    def flush_summary(self):
+        """
+        Writes the daily summary for everything processed since the last one,
+        prints the run report and schedules the next summary.
+        """
+        newsletters = self.journal.pending_summary() if self.journal else list(self._unsummarized)
+        if newsletters:
+            print(f"Creating Daily Summary Page ({len(newsletters)} newsletters)...")
+            page_id = self.notion.create_daily_summary(newsletters)
+            if page_id:
+                if self.journal:
+                    self.journal.record_summarized([newsletter['id'] for newsletter in newsletters])
+                else:
+                    del self._unsummarized[:len(newsletters)]
+        else:
+            print("No newsletters to summarize.")
+
+        print(self.llm.token_stats())
+        tracer.report()
+        # Start a fresh report window so a long-running process doesn't accumulate spans
+        tracer.reset()
+        if self.journal:
+            self.journal.prune()
+        if self.pipeline.dedup:
+            self.pipeline.dedup.clear()
+        # Bound the rest of the per-process state too
+        if self.llm.cache:
+            self.llm.cache.evict()
+        self.notion.clear_article_locks()
+        self.gmail.forget_labelled()
+        self.next_summary = self._next_summary_after(datetime.now())
+
+    def _next_summary_after(self, now):
+        hour, minute = (int(part) for part in self.summary_time.split(":"))
+        scheduled = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        return scheduled if scheduled > now else scheduled + timedelta(days=1)
+
+    def _start_webhook(self):
+        """
+        Local receiver standing in for Gmail push: any POST (e.g. a Pub/Sub push
+        subscription carrying a Gmail watch() notification) triggers an immediate poll.
+        """
+        daemon = self
+
+        class WebhookHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length) if length else b""
+                self.send_response(204)
+                self.end_headers()
+                try:
+                    print(f"Push notification received: {json.loads(body or b'{}').get('message', {}).get('messageId', 'n/a')}")
+                except ValueError:
+                    print("Push notification received.")
+                daemon._wake.set()
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.webhook_port), WebhookHandler)
+        threading.Thread(target=self._server.serve_forever, name="webhook", daemon=True).start()
+        print(f"Listening for push notifications on http://127.0.0.1:{self.webhook_port}/")
+
+def main():
+    print("Starting Newsletter Digest Agent (daemon mode)...")
+    try:
+        gmail = GmailClient()
+        notion = NotionAgent()
+        llm = LLMProcessor()
+        journal = RunJournal() if os.environ.get("RUN_JOURNAL_ENABLED", "true").lower() == "true" else None
+    except Exception as e:
+        print(f"Initialization failed: {e}")
+        return
+
+    NewsletterDaemon(gmail, llm, notion, journal=journal).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+import time
+import random
+from rate_limit import TokenBucket, AdaptiveConcurrency
+from content_preprocessor import estimate_tokens
+from instrumentation import tracer
+
+def retryable_errors():
+    """
+    Returns (throttle_errors, transient_errors).
+    Quota errors back off and lower concurrency; transient server-side errors
+    back off and retry. google.api_core is imported on first use (it may pull in grpc).
+    """
+    from google.api_core import exceptions as google_exceptions
+    throttle = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+    transient = (
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+    )
+    return throttle, transient
+
+# Rough allowance for the JSON reply when reserving tokens-per-minute
+EXPECTED_OUTPUT_TOKENS = 1500
+
+class LLMUnavailableError(Exception):
+    """
+    Raised when a Gemini call still fails after all retries.
+    """
+
+class GeminiClient:
+    """
+    Wraps GenerativeModel.generate_content with client-side rate limiting
+    (requests/minute and tokens/minute buckets), exponential backoff with
+    jitter on retryable errors, and adaptive concurrency.
+    """
+    def __init__(self, model):
+        self.model = model
+        self.requests = TokenBucket(int(os.environ.get("LLM_RPM", 60)))
+        self.tokens = TokenBucket(int(os.environ.get("LLM_TPM", 250000)))
+        self.concurrency = AdaptiveConcurrency(int(os.environ.get("LLM_MAX_CONCURRENCY", 8)))
+        self.max_retries = int(os.environ.get("LLM_MAX_RETRIES", 5))
+        self.base_delay = float(os.environ.get("LLM_BACKOFF_BASE_SECONDS", 2))
+        self.max_delay = float(os.environ.get("LLM_BACKOFF_MAX_SECONDS", 60))
+
+    def generate(self, prompt, generation_config=None):
+        """
+        Calls the model, retrying throttled and transient failures.
+        generation_config: passed through to generate_content (e.g. JSON mode and a response schema).
+        Raises LLMUnavailableError once retries are exhausted.
+        """
+        throttle_errors, transient_errors = retryable_errors()
+        for attempt in range(self.max_retries + 1):
+            self.requests.acquire()
+            self.tokens.acquire(estimate_tokens(prompt) + EXPECTED_OUTPUT_TOKENS)
+            try:
+                with self.concurrency, tracer.span("llm.generate", attempt=attempt + 1) as span:
+                    response = self.model.generate_content(prompt, generation_config=generation_config)
+                    usage = getattr(response, "usage_metadata", None)
+                    span["prompt_tokens"] = getattr(usage, "prompt_token_count", None) or estimate_tokens(prompt)
+                    span["output_tokens"] = getattr(usage, "candidates_token_count", None)
+                self.concurrency.on_success()
+                return response
+            except throttle_errors + transient_errors as e:
+                if isinstance(e, throttle_errors):
+                    self.concurrency.on_throttled()
+                if attempt == self.max_retries:
+                    raise LLMUnavailableError(f"Gemini call failed after {attempt + 1} attempts: {e}") from e
+                # Full jitter keeps parallel workers from retrying in lockstep
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                print(f"  - Gemini {type(e).__name__}; retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries}).")
+                time.sleep(delay)
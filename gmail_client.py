@@ -10,56 +10,387 @@ except ImportError:
 
 import os.path
 import base64
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from bs4 import BeautifulSoup
+import re
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from googleapiclient.errors import HttpError
+from html_text import html_to_text
+from instrumentation import tracer
 
 SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]
 
+# Gmail allows at most 100 sub-requests per batch HTTP call
+BATCH_SIZE = 100
+# messages.batchModify accepts at most 1000 message ids per call
+BATCH_MODIFY_SIZE = 1000
+# messages.list returns at most 500 results per page
+MAX_PAGE_SIZE = 500
+
+NEWSLETTER_LABEL = "newsletter"
+PROCESSED_LABEL = "Agent/newsletter processed"
+
+# Incremental sync state (last historyId + unprocessed messages)
+SYNC_STATE_FILE = os.environ.get("GMAIL_SYNC_STATE_FILE", "sync_state.json")
+# Matches the newer_than:2d window of the query-based scan
+SYNC_RETRY_WINDOW = timedelta(days=2)
+
+# Local copy of the Gmail v1 discovery document, parsed once and shared by every service
+DISCOVERY_CACHE_FILE = os.environ.get("GMAIL_DISCOVERY_CACHE", "gmail_v1_discovery.json")
+DISCOVERY_URL = "https://gmail.googleapis.com/$discovery/rest?version=v1"
+_discovery_document = None
+_discovery_lock = threading.Lock()
+
+def discovery_document():
+    """
+    Returns the parsed Gmail v1 discovery document.
+    Read from DISCOVERY_CACHE_FILE when present; otherwise taken from the copy
+    bundled with google-api-python-client (or downloaded once) and cached there.
+    """
+    global _discovery_document
+    with _discovery_lock:
+        if _discovery_document is not None:
+            return _discovery_document
+        if os.path.exists(DISCOVERY_CACHE_FILE):
+            with open(DISCOVERY_CACHE_FILE) as f:
+                _discovery_document = json.load(f)
+            return _discovery_document
+
+        from googleapiclient.discovery_cache import get_static_doc
+        content = get_static_doc("gmail", "v1")
+        if content is None:
+            import httplib2
+            response, content = httplib2.Http().request(DISCOVERY_URL)
+            if response.status != 200:
+                raise HttpError(response, content, uri=DISCOVERY_URL)
+            content = content.decode("utf-8")
+        _discovery_document = json.loads(content)
+        with open(DISCOVERY_CACHE_FILE, "w") as f:
+            f.write(content)
+        return _discovery_document
+
+# Headers requested by the metadata-only triage fetch
+METADATA_HEADERS = ["Subject", "From", "Date", "List-Id"]
+
+def header_value(headers, name, default):
+    """
+    First value of a header (case-insensitive) from a Gmail payload header list.
+    """
+    name = name.lower()
+    return next((h["value"] for h in headers if h["name"].lower() == name), default)
+
 class GmailClient:
-    def __init__(self):
-        self.creds = self._get_credentials()
-        self.service = build("gmail", "v1", credentials=self.creds)
+    def __init__(self, service=None, token_file=None, sync_state_file=None):
+        """
+        service: optional pre-built (thread-safe) Gmail service, e.g. a local
+        stand-in for benchmarks. Skips credential loading when given.
+        token_file / sync_state_file: per-mailbox credentials and incremental sync
+        state (defaults: token.json and GMAIL_SYNC_STATE_FILE).
+        """
+        self.token_file = token_file or "token.json"
+        self.sync_state_file = sync_state_file or SYNC_STATE_FILE
+        self._shared_service = service
+        self.creds = self._get_credentials() if service is None else None
+        self._local = threading.local()
+        # Label name -> id, resolved once per run
+        self._label_ids = None
+        self._label_lock = threading.RLock()
+        # Incremental sync bookkeeping
+        self._sync_history_id = None
+        self._sync_pending = {}
+        self._labelled_ids = set()
+
+    @property
+    def service(self):
+        """
+        Gmail API service for the calling thread.
+        httplib2 connections are not thread-safe, so each pipeline worker gets its own.
+        """
+        if self._shared_service is not None:
+            return self._shared_service
+        service = getattr(self._local, "service", None)
+        if service is None:
+            from googleapiclient.discovery import build_from_document
+            service = build_from_document(discovery_document(), credentials=self.creds)
+            self._local.service = service
+        return service
 
     def _get_credentials(self):
+        from google.oauth2.credentials import Credentials
+        from google.auth.transport.requests import Request
+
         creds = None
-        if os.path.exists("token.json"):
-            creds = Credentials.from_authorized_user_file("token.json", SCOPES)
+        if os.path.exists(self.token_file):
+            creds = Credentials.from_authorized_user_file(self.token_file, SCOPES)
         
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
                 creds.refresh(Request())
             else:
-                raise Exception("Valid token.json not found. Please run gmail_auth.py first.")
+                raise Exception(f"Valid {self.token_file} not found. Please run gmail_auth.py first.")
         return creds
 
-    def search_newsletters(self):
+    def search_newsletters(self, page_size=None, limit=None, incremental=None):
         """
         Search for emails in 'Forums' category from yesterday/today 
         that haven't been processed yet.
+        Yields message stubs page by page so processing can start before listing finishes.
+
+        In incremental mode (GMAIL_INCREMENTAL_SYNC=true) only messages added to the
+        newsletter label since the last saved historyId are listed, falling back to
+        the query scan when there is no saved state or the history id has expired.
+        Call save_sync_state() once the run has finished.
         """
+        if incremental is None:
+            incremental = os.environ.get("GMAIL_INCREMENTAL_SYNC", "false").lower() == "true"
+
+        # Ids already handed out by the history sync, skipped if it falls back to the query scan
+        yielded = set()
+        if incremental:
+            state = self._load_sync_state()
+            self._sync_pending = dict(state.get("pending", {}))
+            if state.get("history_id"):
+                try:
+                    for message in self._iter_history_messages(state["history_id"]):
+                        yielded.add(message['id'])
+                        yield message
+                    return
+                except HttpError as e:
+                    if e.resp.status != 404:
+                        raise
+                    print("Saved historyId has expired; falling back to a full query scan.")
+            # Snapshot the mailbox position before scanning so nothing added meanwhile is missed
+            with tracer.span("gmail.profile.get"):
+                self._sync_history_id = self.service.users().getProfile(userId="me").execute()["historyId"]
+
         # Query: category:forums -label:"Newsletter Processed" after:yesterday
         # Note: 'after:yesterday' in Gmail query means emails from yesterday and today.
-        query = 'label:newsletter -label:"Agent/newsletter processed" newer_than:2d'
-        
-        results = self.service.users().messages().list(userId="me", q=query).execute()
-        messages = results.get("messages", [])
-        return messages
+        query = f'label:{NEWSLETTER_LABEL} -label:"{PROCESSED_LABEL}" newer_than:2d'
+        for message in self.iter_messages(query, page_size=page_size, limit=limit):
+            if message['id'] in yielded:
+                continue
+            if incremental:
+                self._track_pending(message['id'])
+            yield message
+
+    def search_newsletters_between(self, start, end, page_size=None, limit=None):
+        """
+        Unprocessed newsletters received on or after `start` and before `end`
+        (datetime.date, local midnight), e.g. one day of a backfill.
+        Doesn't touch the incremental sync state.
+        """
+        after = int(datetime.combine(start, datetime.min.time()).timestamp())
+        before = int(datetime.combine(end, datetime.min.time()).timestamp())
+        # Epoch seconds rather than YYYY/MM/DD, which Gmail reads as Pacific-time midnight
+        query = f'label:{NEWSLETTER_LABEL} -label:"{PROCESSED_LABEL}" after:{after} before:{before}'
+        yield from self.iter_messages(query, page_size=page_size, limit=limit)
+
+    def _iter_history_messages(self, start_history_id):
+        """
+        Yields messages added to the newsletter label since start_history_id,
+        plus messages from earlier runs that still haven't been processed.
+        """
+        now = datetime.now(timezone.utc)
+        for msg_id, first_seen in list(self._sync_pending.items()):
+            if now - datetime.fromisoformat(first_seen) > SYNC_RETRY_WINDOW:
+                del self._sync_pending[msg_id]
+            else:
+                yield {"id": msg_id}
+
+        label_id = self.get_label_id(NEWSLETTER_LABEL, create=False)
+        processed_id = self.get_label_id(PROCESSED_LABEL, create=False)
+        if not label_id:
+            print(f"Label '{NEWSLETTER_LABEL}' not found; nothing to sync.")
+            self._sync_history_id = start_history_id
+            return
+
+        page_token = None
+        while True:
+            with tracer.span("gmail.history.list"):
+                results = self.service.users().history().list(
+                    userId="me", startHistoryId=start_history_id, labelId=label_id,
+                    historyTypes=["messageAdded", "labelAdded"], pageToken=page_token
+                ).execute()
+
+            for record in results.get("history", []):
+                added = record.get("messagesAdded", []) + record.get("labelsAdded", [])
+                for item in added:
+                    message = item["message"]
+                    label_ids = message.get("labelIds", [])
+                    if label_id not in label_ids or processed_id in label_ids:
+                        continue
+                    if message['id'] in self._sync_pending:
+                        continue
+                    self._track_pending(message['id'])
+                    yield {"id": message['id'], "threadId": message.get("threadId")}
+
+            self._sync_history_id = results.get("historyId", self._sync_history_id)
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                return
+
+    def _track_pending(self, msg_id):
+        self._sync_pending.setdefault(msg_id, datetime.now(timezone.utc).isoformat())
+
+    def _load_sync_state(self):
+        if not os.path.exists(self.sync_state_file):
+            return {}
+        with open(self.sync_state_file) as f:
+            return json.load(f)
+
+    def save_sync_state(self):
+        """
+        Persists the latest historyId and any listed messages that weren't labelled
+        as processed (they are retried on later runs for up to two days).
+        No-op unless the last search ran in incremental mode.
+        """
+        self.forget_labelled()
+        if self._sync_history_id is None:
+            return
+        pending = self._sync_pending
+        state = {"history_id": self._sync_history_id, "pending": pending}
+        with open(self.sync_state_file, "w") as f:
+            json.dump(state, f, indent=2)
+        print(f"Saved sync state at historyId {self._sync_history_id} ({len(pending)} pending).")
+
+    def forget_labelled(self):
+        """
+        Drops the messages labelled so far from the pending list and forgets them,
+        so a long-running process doesn't keep every id it has ever labelled.
+        """
+        self._sync_pending = {msg_id: first_seen for msg_id, first_seen in self._sync_pending.items()
+                              if msg_id not in self._labelled_ids}
+        self._labelled_ids.clear()
+
+    def iter_messages(self, query, page_size=None, limit=None):
+        """
+        Generator over all messages matching `query`, following nextPageToken.
+        page_size: maxResults per list call (Gmail caps this at 500).
+        limit: overall cap on the number of messages yielded.
+        """
+        page_size = min(page_size or int(os.environ.get("GMAIL_PAGE_SIZE", 100)), MAX_PAGE_SIZE)
+        limit = limit or int(os.environ.get("GMAIL_MAX_MESSAGES", 1000))
+
+        yielded = 0
+        page_token = None
+        while True:
+            with tracer.span("gmail.messages.list") as span:
+                results = self.service.users().messages().list(
+                    userId="me", q=query, maxResults=min(page_size, limit - yielded), pageToken=page_token
+                ).execute()
+                span["items"] = len(results.get("messages", []))
+            for message in results.get("messages", []):
+                yield message
+                yielded += 1
+
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                return
+            if yielded >= limit:
+                print(f"Reached message cap of {limit}; remaining results will be picked up next run.")
+                return
 
     def get_email_details(self, msg_id):
         """
         Fetches full email content and metadata.
         Returns a dict with subject, sender, body, date, etc.
         """
-        msg = self.service.users().messages().get(userId="me", id=msg_id, format='full').execute()
+        with tracer.span("gmail.messages.get", msg_id=msg_id):
+            msg = self.service.users().messages().get(userId="me", id=msg_id, format='full').execute()
+        return self._parse_message(msg)
+
+    def get_email_details_batch(self, msg_ids, batch_size=BATCH_SIZE):
+        """
+        Fetches many emails using Gmail batch requests (up to 100 per HTTP call).
+        Returns a list of dicts in the same shape as get_email_details, in input order.
+        Sub-requests that fail are retried individually; messages that still fail are skipped.
+        """
+        msg_ids = list(dict.fromkeys(msg_ids))  # batch request ids must be unique
+        fetched = self._batch_get(msg_ids, batch_size, "gmail.messages.batch_get", format='full')
+
+        details = {}
+        for msg_id, msg in fetched.items():
+            try:
+                with tracer.message(msg_id):
+                    details[msg_id] = self._parse_message(msg)
+            except Exception as e:
+                print(f"Error parsing message {msg_id}: {e}")
+
+        return [details[msg_id] for msg_id in msg_ids if msg_id in details]
+
+    def get_email_metadata_batch(self, msg_ids, batch_size=BATCH_SIZE):
+        """
+        Fetches headers and size only (format='metadata') for many emails, so they
+        can be triaged before their bodies are downloaded.
+        Returns dicts with id, subject, sender, date, list_id and size, in input order.
+        """
+        msg_ids = list(dict.fromkeys(msg_ids))
+        fetched = self._batch_get(msg_ids, batch_size, "gmail.messages.batch_get_metadata",
+                                  format='metadata', metadataHeaders=METADATA_HEADERS)
+        metadata = []
+        for msg_id in msg_ids:
+            if msg_id not in fetched:
+                continue
+            msg = fetched[msg_id]
+            headers = msg.get('payload', {}).get("headers", [])
+            metadata.append({
+                "id": msg_id,
+                "subject": header_value(headers, "Subject", "No Subject"),
+                "sender": header_value(headers, "From", "Unknown Sender"),
+                "date": header_value(headers, "Date", ""),
+                "list_id": header_value(headers, "List-Id", ""),
+                "size": msg.get("sizeEstimate", 0),
+            })
+        return metadata
+
+    def _batch_get(self, msg_ids, batch_size, span, **params):
+        """
+        messages.get for many ids via batch HTTP requests; `params` are passed to each get.
+        Sub-requests that fail are retried individually. Returns {msg_id: message resource}.
+        """
+        batch_size = min(batch_size, BATCH_SIZE)
+        fetched = {}
+        failed = []
+
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                failed.append(request_id)
+            else:
+                fetched[request_id] = response
+
+        for start in range(0, len(msg_ids), batch_size):
+            chunk = msg_ids[start:start + batch_size]
+            batch = self.service.new_batch_http_request(callback=on_response)
+            for msg_id in chunk:
+                request = self.service.users().messages().get(userId="me", id=msg_id, **params)
+                batch.add(request, request_id=msg_id)
+            try:
+                with tracer.span(span, items=len(chunk)):
+                    batch.execute()
+            except Exception as e:
+                print(f"Batch fetch failed ({e}), falling back to per-message fetch.")
+                failed.extend(msg_id for msg_id in chunk if msg_id not in fetched and msg_id not in failed)
+
+        # Fallback: fetch failed sub-requests one at a time
+        for msg_id in failed:
+            try:
+                with tracer.span("gmail.messages.get", msg_id=msg_id):
+                    fetched[msg_id] = self.service.users().messages().get(userId="me", id=msg_id, **params).execute()
+            except Exception as e:
+                print(f"Error fetching message {msg_id}: {e}")
+        return fetched
+
+    def _parse_message(self, msg):
+        """
+        Converts a format='full' Gmail message resource into the details dict.
+        """
+        msg_id = msg['id']
         payload = msg['payload']
         headers = payload.get("headers", [])
         
-        subject = next((h["value"] for h in headers if h["name"] == "Subject"), "No Subject")
-        sender = next((h["value"] for h in headers if h["name"] == "From"), "Unknown Sender")
-        date = next((h["value"] for h in headers if h["name"] == "Date"), "")
+        subject = header_value(headers, "Subject", "No Subject")
+        sender = header_value(headers, "From", "Unknown Sender")
+        date = header_value(headers, "Date", "")
 
         body = self._get_body(payload)
         
@@ -68,85 +399,156 @@ class GmailClient:
             "subject": subject,
             "sender": sender,
             "date": date,
+            "list_id": header_value(headers, "List-Id", ""),
             "body": body
         }
 
     def _get_body(self, payload):
         """
-        Recursively extracts text body from email payload.
+        Recursively extracts text body from email payload, walking nested
+        multipart/* containers (e.g. multipart/mixed > multipart/alternative).
         Prefers plain text, falls back to HTML (cleaned).
         """
-        body = ""
-        if 'parts' in payload:
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/plain':
-                    data = part['body'].get('data')
-                    if data:
-                        body += base64.urlsafe_b64decode(data).decode()
-                elif part['mimeType'] == 'text/html':
-                    # If we haven't found plain text yet, or if we want to append?
-                    # Usually plain text is preferred for LLMs. 
-                    # If plain text is empty, try HTML.
-                    if not body:
-                        data = part['body'].get('data')
-                        if data:
-                            html_content = base64.urlsafe_b64decode(data).decode()
-                            soup = BeautifulSoup(html_content, 'html.parser')
-                            body = soup.get_text(separator='\n')
-        else:
-            # Single part email
-            data = payload['body'].get('data')
-            if data:
-                decoded = base64.urlsafe_b64decode(data).decode()
-                if payload['mimeType'] == 'text/html':
-                    soup = BeautifulSoup(decoded, 'html.parser')
-                    body = soup.get_text(separator='\n')
-                else:
-                    body = decoded
-        
+        plain_parts = []
+        html_parts = []
+        self._collect_text_parts(payload, plain_parts, html_parts)
+
+        body = "\n".join(part for part in plain_parts if part.strip())
+        if not body:
+            with tracer.span("html.parse", bytes=sum(len(part) for part in html_parts)):
+                body = "\n".join(html_to_text(part) for part in html_parts)
         return body
 
-    def add_label(self, msg_id, label_name="Newsletter Processed"):
+    def _collect_text_parts(self, part, plain_parts, html_parts):
+        if part.get('parts'):
+            for child in part['parts']:
+                self._collect_text_parts(child, plain_parts, html_parts)
+            return
+
+        # Skip attached .txt/.html files
+        if part.get('filename'):
+            return
+
+        data = part.get('body', {}).get('data')
+        if not data:
+            return
+        if part['mimeType'] == 'text/plain':
+            plain_parts.append(self._decode_part(part, data))
+        elif part['mimeType'] == 'text/html':
+            html_parts.append(self._decode_part(part, data))
+
+    def _decode_part(self, part, data):
         """
-        Adds a label to a message. Creates the label if it doesn't exist.
+        Decodes a base64url part body using the charset from its Content-Type header.
+        """
+        content_type = next((h["value"] for h in part.get("headers", []) if h["name"].lower() == "content-type"), "")
+        match = re.search(r'charset="?([\w.:-]+)"?', content_type, re.IGNORECASE)
+        charset = match.group(1) if match else "utf-8"
+        raw = base64.urlsafe_b64decode(data)
+        try:
+            return raw.decode(charset, errors="replace")
+        except LookupError:
+            return raw.decode("utf-8", errors="replace")
+
+    def list_labels(self):
+        """
+        Lists all labels in the mailbox and refreshes the label-id cache.
         """
-        # 1. Check if label exists, get ID
-        results = self.service.users().labels().list(userId="me").execute()
+        with tracer.span("gmail.labels.list"):
+            results = self.service.users().labels().list(userId="me").execute()
         labels = results.get("labels", [])
-        label_id = None
-        for label in labels:
-            if label['name'] == label_name:
-                label_id = label['id']
-                break
-        
-        # 2. Create if not exists
-        if not label_id:
+        with self._label_lock:
+            self._label_ids = {label['name']: label['id'] for label in labels}
+        return labels
+
+    def get_label_id(self, label_name, create=True):
+        """
+        Resolves a label name to its id, listing labels at most once per run.
+        Creates the label if it doesn't exist (unless create=False, which returns None).
+        """
+        if self._label_ids is None:
+            self.list_labels()
+
+        label_id = self._find_cached_label(label_name)
+        if label_id or not create:
+            return label_id
+
+        with self._label_lock:
+            # Another worker may have created it while we waited
+            label_id = self._find_cached_label(label_name)
+            if label_id:
+                return label_id
             try:
                 label_object = {'name': label_name}
-                created_label = self.service.users().labels().create(userId="me", body=label_object).execute()
+                with tracer.span("gmail.labels.create"):
+                    created_label = self.service.users().labels().create(userId="me", body=label_object).execute()
                 label_id = created_label['id']
             except Exception as e:
                 # If label exists (409), try to find it again (maybe case sensitivity issue or race condition)
                 if "Label name exists" in str(e) or "409" in str(e):
-                    results = self.service.users().labels().list(userId="me").execute()
-                    labels = results.get("labels", [])
-                    for label in labels:
-                        if label['name'].lower() == label_name.lower(): 
-                            label_id = label['id']
-                            break
-                
+                    self.list_labels()
+                    label_id = self._find_cached_label(label_name)
+
                 if not label_id:
                     raise e
-        
-        # 3. Apply label
+            self._label_ids[label_name] = label_id
+        return label_id
+
+    def _find_cached_label(self, label_name):
+        label_ids = self._label_ids or {}
+        if label_name in label_ids:
+            return label_ids[label_name]
+        # Gmail label names are case-insensitive
+        for name, label_id in label_ids.items():
+            if name.lower() == label_name.lower():
+                return label_id
+        return None
+
+    def add_label(self, msg_id, label_name="Newsletter Processed"):
+        """
+        Adds a label to a message. Creates the label if it doesn't exist.
+        """
+        label_id = self.get_label_id(label_name)
         body = {'addLabelIds': [label_id]}
-        self.service.users().messages().modify(userId="me", id=msg_id, body=body).execute()
+        with tracer.span("gmail.messages.modify", msg_id=msg_id):
+            self.service.users().messages().modify(userId="me", id=msg_id, body=body).execute()
         print(f"Applied label '{label_name}' to message {msg_id}")
+        if label_name == PROCESSED_LABEL:
+            self._labelled_ids.add(msg_id)
+
+    def add_label_batch(self, msg_ids, label_name="Newsletter Processed"):
+        """
+        Adds a label to many messages with messages.batchModify (up to 1000 ids per call).
+        """
+        label_id = self.get_label_id(label_name)
+        self._batch_modify(msg_ids, {'addLabelIds': [label_id]})
+        print(f"Applied label '{label_name}' to {len(msg_ids)} messages")
+        if label_name == PROCESSED_LABEL:
+            self._labelled_ids.update(msg_ids)
+
+    def remove_label_batch(self, msg_ids, label_name):
+        """
+        Removes a label from many messages with messages.batchModify.
+        Returns False if the label doesn't exist.
+        """
+        label_id = self.get_label_id(label_name, create=False)
+        if not label_id:
+            return False
+        self._batch_modify(msg_ids, {'removeLabelIds': [label_id]})
+        print(f"Removed label '{label_name}' from {len(msg_ids)} messages")
+        return True
+
+    def _batch_modify(self, msg_ids, body):
+        msg_ids = list(msg_ids)
+        for start in range(0, len(msg_ids), BATCH_MODIFY_SIZE):
+            request_body = dict(body, ids=msg_ids[start:start + BATCH_MODIFY_SIZE])
+            with tracer.span("gmail.messages.batch_modify", items=len(request_body['ids'])):
+                self.service.users().messages().batchModify(userId="me", body=request_body).execute()
 
 if __name__ == "__main__":
     # Test
     client = GmailClient()
-    msgs = client.search_newsletters()
+    msgs = list(client.search_newsletters())
     print(f"Found {len(msgs)} potential newsletters.")
     if msgs:
         details = client.get_email_details(msgs[0]['id'])
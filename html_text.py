@@ -0,0 +1,122 @@
+import re
+from html.parser import HTMLParser
+
+# Elements whose content is never visible text
+SKIPPED_TAGS = {"head", "style", "script", "noscript", "title", "template", "svg"}
+# Elements that start a new line in the rendered output
+BLOCK_TAGS = {
+    "p", "div", "br", "tr", "td", "th", "li", "ul", "ol", "table", "section", "article", "header", "footer",
+    "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "hr", "center",
+}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+# Elements whose end tag is optional, and the start tags that implicitly close them
+IMPLICITLY_CLOSED_BY = {
+    "head": {"body"},
+    "p": BLOCK_TAGS - {"br", "td", "th", "tr"},
+    "li": {"li"},
+    "td": {"td", "th", "tr"},
+    "th": {"td", "th", "tr"},
+}
+
+HIDDEN_STYLE = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden|max-height\s*:\s*0", re.IGNORECASE)
+
+class HTMLTextExtractor(HTMLParser):
+    """
+    Streaming HTML-to-text converter.
+    Unlike building a full BeautifulSoup tree, this makes a single pass over the
+    markup, drops <style>/<script>/hidden elements (e.g. preheader text) and keeps
+    link targets inline as "text (url)" so the LLM can still cite article URLs.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._parts = []
+        self._skip_tag = None
+        self._skip_nesting = 0
+        # Depth of the hidden element in the open-element stack
+        self._skip_depth = 0
+        self._open = []
+        self._links = []
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip_tag:
+            if self._skip_nesting == 1 and tag in IMPLICITLY_CLOSED_BY.get(self._skip_tag, ()):
+                # e.g. <p style="display:none">preheader<p>content: the next block ends the hidden one
+                self._end_skip()
+            else:
+                if tag == self._skip_tag:
+                    self._skip_nesting += 1
+                if tag not in VOID_TAGS:
+                    self._open.append(tag)
+                return
+
+        attrs = dict(attrs)
+        if tag not in VOID_TAGS:
+            self._open.append(tag)
+        if tag in SKIPPED_TAGS or "hidden" in attrs or HIDDEN_STYLE.search(attrs.get("style") or ""):
+            if tag not in VOID_TAGS:
+                self._skip_tag = tag
+                self._skip_nesting = 1
+                self._skip_depth = len(self._open) - 1
+            return
+
+        if tag in BLOCK_TAGS:
+            self._parts.append("\n")
+        if tag == "li":
+            self._parts.append("- ")
+        elif tag == "a":
+            self._links.append((attrs.get("href") or "", len(self._parts)))
+
+    def handle_endtag(self, tag):
+        if self._skip_tag:
+            if tag == self._skip_tag:
+                self._skip_nesting -= 1
+                if self._skip_nesting == 0:
+                    self._end_skip()
+                else:
+                    self._close(tag)
+                return
+            if tag not in self._open[:self._skip_depth]:
+                self._close(tag)
+                return
+            # A parent closed while the hidden element was still open (missing end tag)
+            self._end_skip()
+        self._close(tag)
+
+        if tag == "a" and self._links:
+            href, start = self._links.pop()
+            text = "".join(self._parts[start:]).strip()
+            if href.startswith(("http://", "https://")) and text and href != text:
+                self._parts.append(f" ({href})")
+        elif tag in BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def _end_skip(self):
+        del self._open[self._skip_depth:]
+        self._skip_tag = None
+        self._skip_nesting = 0
+
+    def _close(self, tag):
+        # Pops tag and anything left open inside it; stray end tags are ignored
+        for i in range(len(self._open) - 1, -1, -1):
+            if self._open[i] == tag:
+                del self._open[i:]
+                return
+
+    def handle_data(self, data):
+        if not self._skip_tag:
+            self._parts.append(re.sub(r"\s+", " ", data))
+
+    def get_text(self):
+        lines = (line.strip() for line in "".join(self._parts).splitlines())
+        text = "\n".join(lines)
+        return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+def html_to_text(html):
+    """
+    Converts an HTML email body to readable plain text.
+    """
+    parser = HTMLTextExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.get_text()
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+class Tracer:
+    """
+    Records a timed span for every stage and API call (Gmail fetch, HTML parse,
+    LLM call, Notion write, label write, ...), emits each one as a JSON line and
+    summarizes them in an end-of-run report.
+    Spans inherit the message id of the pipeline stage that issued them.
+    """
+    def __init__(self, path=None):
+        self.path = path if path is not None else os.environ.get("RUN_TRACE_FILE", "run_trace.jsonl")
+        self.spans = []
+        self.run_started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._file = None
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """
+        Times the enclosed block. Extra attributes can be added while it runs
+        via the yielded dict (e.g. token counts once the response arrives).
+        """
+        record = {"name": name, "msg_id": getattr(self._local, "msg_id", None)}
+        record.update(attrs)
+        start = time.perf_counter()
+        try:
+            yield record
+            record.setdefault("status", "ok")
+        except BaseException as e:
+            record["status"] = "error"
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            record["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            record["ts"] = datetime.now(timezone.utc).isoformat()
+            self._emit(record)
+
+    @contextmanager
+    def message(self, msg_id):
+        """
+        Attributes all spans opened by this thread to msg_id.
+        """
+        previous = getattr(self._local, "msg_id", None)
+        self._local.msg_id = msg_id
+        try:
+            yield
+        finally:
+            self._local.msg_id = previous
+
+    def wrap(self, func):
+        """
+        Carries the caller's message id into a function run on another thread.
+        """
+        msg_id = getattr(self._local, "msg_id", None)
+
+        def wrapped(*args, **kwargs):
+            with self.message(msg_id):
+                return func(*args, **kwargs)
+        return wrapped
+
+    def _emit(self, record):
+        with self._lock:
+            self.spans.append(record)
+            if not self.path:
+                return
+            if self._file is None:
+                self._file = open(self.path, "a")
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+    def report(self):
+        """
+        Prints p50/p95 latency, call counts and totals per span, and per subsystem
+        (the span name prefix: gmail, html, llm, notion, pipeline).
+        Returns the report as a dict and appends it to the trace file.
+        """
+        with self._lock:
+            spans = list(self.spans)
+
+        by_name = {}
+        for record in spans:
+            by_name.setdefault(record["name"], []).append(record)
+
+        stages = {}
+        subsystems = {}
+        for name, records in sorted(by_name.items()):
+            durations = sorted(r["duration_ms"] for r in records)
+            stats = {
+                "calls": len(records),
+                "errors": sum(1 for r in records if r["status"] == "error"),
+                "p50_ms": percentile(durations, 50),
+                "p95_ms": percentile(durations, 95),
+                "total_ms": round(sum(durations), 2),
+            }
+            for key in ("prompt_tokens", "output_tokens", "items"):
+                values = [r[key] for r in records if isinstance(r.get(key), (int, float))]
+                if values:
+                    stats[key] = sum(values)
+            stages[name] = stats
+
+            subsystem = subsystems.setdefault(name.split(".")[0], {"calls": 0, "errors": 0, "total_ms": 0.0})
+            subsystem["calls"] += stats["calls"]
+            subsystem["errors"] += stats["errors"]
+            subsystem["total_ms"] = round(subsystem["total_ms"] + stats["total_ms"], 2)
+
+        wall_ms = round((time.perf_counter() - self.run_started) * 1000, 2)
+        report = {"type": "report", "wall_ms": wall_ms, "stages": stages, "subsystems": subsystems}
+
+        print("\n=== Run Report ===")
+        print(f"Wall time: {wall_ms / 1000:.1f}s")
+        print(f"{'stage':<32}{'calls':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'total s':>10}")
+        for name, stats in stages.items():
+            print(f"{name:<32}{stats['calls']:>7}{stats['errors']:>8}{stats['p50_ms']:>10.0f}"
+                  f"{stats['p95_ms']:>10.0f}{stats['total_ms'] / 1000:>10.1f}")
+        print("Per subsystem:")
+        for name, stats in subsystems.items():
+            print(f"  {name:<10} {stats['calls']} calls, {stats['errors']} errors, {stats['total_ms'] / 1000:.1f}s total")
+        tokens = stages.get("llm.generate", {})
+        if tokens.get("prompt_tokens") is not None:
+            print(f"LLM tokens: {tokens.get('prompt_tokens', 0)} prompt, {tokens.get('output_tokens', 0)} output")
+
+        if self.path:
+            self._emit_report(report)
+        return report
+
+    def reset(self):
+        """
+        Starts a new report window (long-running processes report once per day).
+        The trace file is rotated too: the previous window is kept as <file>.1,
+        so a resident process keeps at most two windows of spans on disk.
+        """
+        with self._lock:
+            self.spans = []
+            self.run_started = time.perf_counter()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self.path and os.path.exists(self.path):
+                os.replace(self.path, self.path + ".1")
+
+    def _emit_report(self, report):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a")
+            self._file.write(json.dumps(report) + "\n")
+            self._file.flush()
+
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+# Process-wide tracer shared by all clients
+tracer = Tracer()
@@ -0,0 +1,86 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+class LLMCache:
+    """
+    Persistent on-disk cache of LLM extraction results, keyed by a content hash.
+    Lets re-runs (after reset_labels.py, crash recovery, duplicate deliveries)
+    skip the Gemini call entirely.
+    """
+    def __init__(self, path=None, max_entries=None, max_age_days=None):
+        self.path = path or os.environ.get("LLM_CACHE_PATH", "llm_cache.sqlite3")
+        self.max_entries = max_entries or int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 5000))
+        self.max_age_days = max_age_days or float(os.environ.get("LLM_CACHE_MAX_AGE_DAYS", 30))
+        self.hits = 0
+        self.misses = 0
+
+        # Shared by the pipeline's worker threads
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            " key TEXT PRIMARY KEY,"
+            " result TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(model_name, prompt_version, subject, body):
+        """
+        Hashes everything that determines the extraction output.
+        Whitespace in the body is normalized so re-encoded copies of the same email match.
+        """
+        normalized_body = re.sub(r"\s+", " ", body or "").strip()
+        material = "\x1f".join([model_name, str(prompt_version), subject or "", normalized_body])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached result (decoded JSON) or None.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM extractions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE extractions SET last_used_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key, result):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, result, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(result), now, now)
+            )
+            self._conn.commit()
+
+    def evict(self):
+        """
+        Drops entries older than max_age_days, then the least recently used
+        entries beyond max_entries.
+        """
+        cutoff = time.time() - self.max_age_days * 86400
+        with self._lock:
+            self._conn.execute("DELETE FROM extractions WHERE created_at < ?", (cutoff,))
+            self._conn.execute(
+                "DELETE FROM extractions WHERE key NOT IN ("
+                " SELECT key FROM extractions ORDER BY last_used_at DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total * 100) if total else 0.0
+        return f"LLM cache: {self.hits} hits, {self.misses} misses ({hit_rate:.0f}% hit rate)"
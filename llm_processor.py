@@ -1,33 +1,125 @@
 import os
-import json
-import google.generativeai as genai
 from dotenv import load_dotenv
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from llm_cache import LLMCache
+from gemini_client import GeminiClient, LLMUnavailableError
+from content_preprocessor import clean_body, split_sections, estimate_tokens
+from article_schema import (TOP_ARTICLES, ARTICLES_SCHEMA, BATCH_SCHEMA, generation_config,
+                            parse_reply, validate_articles)
+from instrumentation import tracer
 
 load_dotenv()
 
+# Bump whenever the extraction prompt changes so cached results are invalidated
+PROMPT_VERSION = 3
+
 class LLMProcessor:
-    def __init__(self):
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables.")
-        
-        genai.configure(api_key=api_key)
+    def __init__(self, model=None):
+        """
+        model: optional object with generate_content(prompt), e.g. a local
+        stand-in for benchmarks. Skips Gemini configuration when given.
+        """
         # Using gemini-2.5-flash-lite as requested
-        self.model = genai.GenerativeModel('gemini-2.5-flash-lite')
+        self.model_name = 'gemini-2.5-flash-lite'
+        if model is None:
+            api_key = os.environ.get("GEMINI_API_KEY")
+            if not api_key:
+                raise ValueError("GEMINI_API_KEY not found in environment variables.")
+            
+            # Deferred: google.generativeai is one of the slowest imports in the agent
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(self.model_name)
+        self.model = model
+        # Rate limiting, retries and adaptive concurrency around generate_content
+        self.client = GeminiClient(self.model)
+
+        # Cleaned newsletters above this are split into sections and extracted in parallel
+        self.max_input_tokens = int(os.environ.get("LLM_MAX_INPUT_TOKENS", 7500))
+        self.section_workers = int(os.environ.get("LLM_SECTION_WORKERS", 3))
+        self.tokens_in = 0
+        self.tokens_saved = 0
+        self._stats_lock = threading.Lock()
+
+        # Batched mode packs several short newsletters into one request
+        self.batch_mode = os.environ.get("LLM_BATCH_MODE", "false").lower() == "true"
+        self.batch_token_budget = int(os.environ.get("LLM_BATCH_TOKEN_BUDGET", 24000))
+        self.batch_max_newsletters = int(os.environ.get("LLM_BATCH_MAX_NEWSLETTERS", 8))
+
+        # Gemini JSON mode with a response schema; off falls back to prompt-only formatting
+        self.json_mode = os.environ.get("LLM_JSON_MODE", "true").lower() == "true"
+
+        self.cache = None
+        if os.environ.get("LLM_CACHE_ENABLED", "true").lower() == "true":
+            self.cache = LLMCache()
 
     def process_newsletter(self, email_subject, email_body, newsletter_name="Unknown"):
         """
         Analyzes newsletter content and extracts top 5 articles.
-        Returns a list of article dictionaries.
+        Boilerplate is stripped first; newsletters still over the token budget are
+        split into sections that are extracted in parallel and merged.
+        Returns a list of article dictionaries, or None if extraction failed
+        (as opposed to an empty list for a newsletter with no articles).
         """
-        prompt = f"""
+        cache_key = LLMCache.make_key(self.model_name, PROMPT_VERSION, email_subject, email_body)
+        if self.cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return self._enrich(cached, newsletter_name, email_subject)
+
+        body = self.preprocess(email_body)
+
+        try:
+            if estimate_tokens(body) <= self.max_input_tokens:
+                articles = validate_articles(self._extract(self._build_prompt(email_subject, body, newsletter_name)))
+            else:
+                articles = self._extract_sections(email_subject, body, newsletter_name)
+
+            # Empty results are cached too, so a newsletter with no articles isn't re-sent
+            if self.cache and articles is not None:
+                self.cache.set(cache_key, articles)
+            
+            return self._enrich(articles, newsletter_name, email_subject)
+
+        except LLMUnavailableError as e:
+            # Not cached and not labelled, so the newsletter is retried on the next run
+            print(f"Gemini unavailable for {email_subject}, leaving it for the next run: {e}")
+            return None
+        except Exception as e:
+            print(f"Error processing newsletter with LLM: {e}")
+            return None
+
+    def preprocess(self, email_body):
+        """
+        Cleans the email body and records how many tokens that saved.
+        """
+        body = clean_body(email_body)
+        self._record_tokens(email_body, body)
+        return body
+
+    def _record_tokens(self, raw_body, clean):
+        raw_tokens = estimate_tokens(raw_body)
+        saved = raw_tokens - estimate_tokens(clean)
+        with self._stats_lock:
+            self.tokens_in += raw_tokens
+            self.tokens_saved += saved
+        if raw_tokens:
+            print(f"  - Preprocessing saved ~{saved} of {raw_tokens} tokens ({saved / raw_tokens:.0%}).")
+
+    def token_stats(self):
+        percent = (self.tokens_saved / self.tokens_in) if self.tokens_in else 0.0
+        return f"Preprocessing: saved ~{self.tokens_saved} of {self.tokens_in} input tokens ({percent:.0%})"
+
+    def _build_prompt(self, email_subject, email_body, newsletter_name):
+        return f"""
         You are an expert newsletter curator. Your task is to analyze the following newsletter and extract the TOP 5 most valuable articles based on practical, actionable insights.
 
         Newsletter Name: {newsletter_name}
         Subject: {email_subject}
 
         CONTENT:
-        {email_body[:30000]}  # Truncate to avoid context limits if extremely long, though 1.5 handles 1M tokens.
+        {email_body}
 
         INSTRUCTIONS:
         1. Identify the most important articles/sections.
@@ -55,30 +147,192 @@ class LLMProcessor:
         ]
         """
 
-        try:
-            response = self.model.generate_content(prompt)
-            text = response.text.strip()
-            
-            # Clean up markdown code blocks if present
-            if text.startswith("```json"):
-                text = text[7:]
-            if text.startswith("```"):
-                text = text[3:]
-            if text.endswith("```"):
-                text = text[:-3]
-            
-            articles = json.loads(text)
-            
-            # Enrich with newsletter metadata
-            for article in articles:
-                article["newsletter_name"] = newsletter_name
-                article["newsletter_subject"] = email_subject
-            
-            return articles
+    def _extract(self, prompt, schema=ARTICLES_SCHEMA):
+        """
+        Calls Gemini and parses the JSON reply, salvaging complete items from a malformed one.
+        """
+        config = generation_config(schema) if self.json_mode else None
+        response = self.client.generate(prompt, generation_config=config)
+        return parse_reply(response.text)
+
+    def _extract_sections(self, email_subject, body, newsletter_name):
+        """
+        Extracts each section of an oversized newsletter in parallel, then
+        merges the candidates and re-ranks them down to the top 5.
+        """
+        sections = split_sections(body, self.max_input_tokens)
+        print(f"  - Splitting {email_subject} into {len(sections)} sections.")
+
+        def extract_section(numbered):
+            i, section = numbered
+            subject = f"{email_subject} (part {i} of {len(sections)})"
+            try:
+                return validate_articles(self._extract(self._build_prompt(subject, section, newsletter_name)))
+            except LLMUnavailableError:
+                # Don't merge (and cache) a partial result when Gemini is out of quota
+                raise
+            except Exception as e:
+                print(f"Error processing section {i} of {email_subject}: {e}")
+                return []
+
+        with ThreadPoolExecutor(max_workers=self.section_workers) as pool:
+            candidates = [article for articles in pool.map(tracer.wrap(extract_section), enumerate(sections, 1)) for article in articles]
+
+        # Drop the same article found in overlapping sections, keeping the better-ranked copy
+        candidates.sort(key=lambda a: (a.get("rank") or TOP_ARTICLES, not a.get("must_read", False)))
+        merged = []
+        seen_urls = set()
+        for article in candidates:
+            url = article.get("url")
+            if url and url in seen_urls:
+                continue
+            seen_urls.add(url)
+            merged.append(article)
+
+        top = merged[:TOP_ARTICLES]
+        for rank, article in enumerate(top, 1):
+            article["rank"] = rank
+            article["must_read"] = rank <= 2
+        return top
 
+    def pack_batches(self, newsletters):
+        """
+        Groups newsletters into batches that fit the per-request token budget.
+        newsletters: list of dicts with 'id', 'subject', 'body', 'newsletter_name'.
+        Newsletters too large to share a request end up in a batch of their own.
+        """
+        batches = []
+        current = []
+        current_tokens = 0
+        for newsletter in newsletters:
+            tokens = estimate_tokens(newsletter['subject']) + estimate_tokens(clean_body(newsletter['body']))
+            if tokens > self.max_input_tokens:
+                # Oversized newsletters go through the sectioned single-newsletter path
+                batches.append([newsletter])
+                continue
+            if current and (current_tokens + tokens > self.batch_token_budget or len(current) >= self.batch_max_newsletters):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(newsletter)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def process_newsletters_batch(self, newsletters):
+        """
+        Extracts articles from several newsletters with a single Gemini request.
+        newsletters: list of dicts with 'id', 'subject', 'body', 'newsletter_name'
+        (call pack_batches first to respect the token budget).
+        Returns a dict mapping newsletter id -> list of article dicts, the same shape
+        process_newsletter returns. Newsletters missing from the reply are retried one by one.
+        """
+        results = {}
+        pending = []
+        for newsletter in newsletters:
+            key = LLMCache.make_key(self.model_name, PROMPT_VERSION, newsletter['subject'], newsletter['body'])
+            cached = self.cache.get(key) if self.cache else None
+            if cached is not None:
+                results[newsletter['id']] = self._enrich(cached, newsletter['newsletter_name'], newsletter['subject'])
+            else:
+                pending.append((key, newsletter))
+
+        if len(pending) == 1:
+            _, newsletter = pending[0]
+            results[newsletter['id']] = self.process_newsletter(
+                newsletter['subject'], newsletter['body'], newsletter_name=newsletter['newsletter_name'])
+            return results
+        if not pending:
+            return results
+
+        cleaned = {newsletter['id']: clean_body(newsletter['body']) for _, newsletter in pending}
+        sections = []
+        for _, newsletter in pending:
+            sections.append(
+                f"=== NEWSLETTER id={newsletter['id']} ===\n"
+                f"Newsletter Name: {newsletter['newsletter_name']}\n"
+                f"Subject: {newsletter['subject']}\n\n"
+                f"{cleaned[newsletter['id']]}\n"
+            )
+
+        prompt = f"""
+        You are an expert newsletter curator. Below are {len(pending)} separate newsletters, each starting with a line "=== NEWSLETTER id=... ===". For EACH newsletter independently, extract the TOP 5 most valuable articles based on practical, actionable insights.
+
+        {"".join(sections)}
+
+        INSTRUCTIONS (apply to each newsletter separately):
+        1. Identify the most important articles/sections.
+        2. Select the top 5 (or fewer if there aren't 5 distinct topics).
+        3. Rank them 1 to 5 (1 is best).
+        4. The top 2 are "must_read": true.
+        5. Extract the URL for each.
+        6. Write a 3-6 sentence summary for each.
+        7. Extract 3-5 actionable bullet points (takeaways).
+        8. Assign a category (e.g., AI, Healthcare, Product, Engineering, Business).
+
+        OUTPUT FORMAT:
+        Return ONLY a valid JSON array with one entry per newsletter. Do not include markdown formatting like ```json.
+        [
+            {{
+                "newsletter_id": "<newsletter id>",
+                "articles": [
+                    {{
+                        "title": "Article Headline",
+                        "url": "https://...",
+                        "summary": "...",
+                        "takeaways": ["point 1", "point 2", ...],
+                        "category": "...",
+                        "must_read": true,
+                        "rank": 1
+                    }},
+                    ...
+                ]
+            }},
+            ...
+        ]
+        """
+
+        try:
+            extracted = self._extract(prompt, schema=BATCH_SCHEMA)
+        except LLMUnavailableError as e:
+            # Retrying each newsletter individually would only hit the same quota
+            print(f"Gemini unavailable for newsletter batch, leaving it for the next run: {e}")
+            for _, newsletter in pending:
+                results[newsletter['id']] = None
+            return results
         except Exception as e:
-            print(f"Error processing newsletter with LLM: {e}")
-            return []
+            print(f"Error processing newsletter batch with LLM: {e}")
+            extracted = []
+
+        replies = {}
+        for entry in extracted if isinstance(extracted, list) else []:
+            if isinstance(entry, dict) and isinstance(entry.get("articles"), list):
+                replies[str(entry.get("newsletter_id"))] = entry["articles"]
+
+        for key, newsletter in pending:
+            articles = replies.get(newsletter['id'])
+            if articles is not None:
+                articles = validate_articles(articles)
+                self._record_tokens(newsletter['body'], cleaned[newsletter['id']])
+                if self.cache:
+                    self.cache.set(key, articles)
+                results[newsletter['id']] = self._enrich(articles, newsletter['newsletter_name'], newsletter['subject'])
+            else:
+                # Fall back to a dedicated request for anything the batch reply missed
+                results[newsletter['id']] = self.process_newsletter(
+                    newsletter['subject'], newsletter['body'], newsletter_name=newsletter['newsletter_name'])
+
+        return results
+
+    def _enrich(self, articles, newsletter_name, email_subject):
+        """
+        Adds newsletter metadata to each article.
+        """
+        for article in articles:
+            article["newsletter_name"] = newsletter_name
+            article["newsletter_subject"] = email_subject
+        return articles
 
 if __name__ == "__main__":
     # Test
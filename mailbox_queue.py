@@ -0,0 +1,247 @@
+# Fix for Python 3.9 compatibility with Google libraries
+import sys
+try:
+    import importlib.metadata as stdlib_metadata
+    if not hasattr(stdlib_metadata, 'packages_distributions'):
+        import importlib_metadata
+        sys.modules['importlib.metadata'] = importlib_metadata
+except ImportError:
+    pass
+
+import os
+import socket
+import argparse
+import threading
+from datetime import date
+from gmail_client import GmailClient
+from work_queue import WorkQueue, load_mailboxes
+from instrumentation import tracer
+
+class LeaseGuard:
+    """
+    Pipeline label_guard for one mailbox: only messages whose lease this worker
+    still holds get labelled, and the ones that were labelled are remembered
+    so the worker can complete exactly those jobs.
+    """
+    def __init__(self, queue, worker_id, mailbox):
+        self.queue = queue
+        self.worker_id = worker_id
+        self.mailbox = mailbox
+        self.done = []
+
+    def claim(self, msg_ids):
+        owned = self.queue.claim(self.worker_id, self.mailbox, msg_ids)
+        if len(owned) < len(msg_ids):
+            print(f"[{self.mailbox}] Lost the lease on {len(msg_ids) - len(owned)} messages; leaving them to their new owner.")
+        return owned
+
+    def labelled(self, msg_ids):
+        self.done.extend(msg_ids)
+
+class QueueWorker:
+    """
+    Leases batches of jobs from the shared queue and runs each mailbox's
+    share through the normal pipeline. Start as many workers as the API
+    quotas allow; the queue keeps them from processing the same message.
+    """
+    def __init__(self, queue, mailboxes, worker_id=None, batch_size=None):
+        # Imported here so enqueue/status don't need Notion or Gemini credentials
+        from notion_agent import NotionAgent
+        from llm_processor import LLMProcessor
+
+        self.queue = queue
+        self.mailboxes = {mailbox["name"]: mailbox for mailbox in mailboxes}
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.batch_size = batch_size or int(os.environ.get("QUEUE_LEASE_BATCH", 10))
+        self.llm = LLMProcessor()
+        self.notion = NotionAgent()
+        # One Gmail client and pipeline per mailbox, built on first use
+        self._pipelines = {}
+        self._stop = threading.Event()
+        # Per-process state is reset when the day changes (see _start_day)
+        self._day = date.today()
+
+    def run(self, forever=False, idle_seconds=None):
+        """
+        Processes jobs until the queue is empty (or, with forever=True, until
+        interrupted, sleeping idle_seconds between empty polls).
+        Returns the number of messages completed.
+        """
+        idle_seconds = idle_seconds or float(os.environ.get("QUEUE_IDLE_SECONDS", 30))
+        quotas = {name: mailbox["max_in_flight"] for name, mailbox in self.mailboxes.items()}
+        heartbeat = threading.Thread(target=self._heartbeat, name="lease-heartbeat", daemon=True)
+        heartbeat.start()
+
+        completed = 0
+        print(f"Worker {self.worker_id} started.")
+        try:
+            while not self._stop.is_set():
+                if date.today() != self._day:
+                    self._start_day()
+                jobs = self.queue.lease(self.worker_id, quotas, self.batch_size)
+                if not jobs:
+                    if not forever:
+                        break
+                    self._stop.wait(idle_seconds)
+                    continue
+
+                by_mailbox = {}
+                for mailbox, msg_id in jobs:
+                    by_mailbox.setdefault(mailbox, []).append(msg_id)
+                for mailbox, msg_ids in by_mailbox.items():
+                    completed += self._process(mailbox, msg_ids)
+        finally:
+            self._stop.set()
+            heartbeat.join()
+            for pipeline, _ in self._pipelines.values():
+                pipeline.close()
+
+        print(f"Worker {self.worker_id} completed {completed} messages.")
+        print(self.llm.token_stats())
+        tracer.report()
+        return completed
+
+    def stop(self):
+        self._stop.set()
+
+    def _process(self, mailbox, msg_ids):
+        pipeline, guard = self._pipeline(mailbox)
+        guard.done = []
+        try:
+            newsletters = pipeline.run([{"id": msg_id} for msg_id in msg_ids])
+        except Exception as e:
+            print(f"[{mailbox}] Batch failed: {e}")
+            self.queue.release(self.worker_id, mailbox, msg_ids, str(e))
+            return 0
+
+        done = set(guard.done)
+        results = {newsletter["id"]: newsletter for newsletter in newsletters if newsletter["id"] in done}
+        self.queue.complete(self.worker_id, mailbox, guard.done, results)
+        # Fetch or extraction failures go back to the pool for another attempt
+        unfinished = [msg_id for msg_id in msg_ids if msg_id not in done]
+        if unfinished:
+            self.queue.release(self.worker_id, mailbox, unfinished, "not labelled")
+        print(f"[{mailbox}] Completed {len(done)}/{len(msg_ids)} messages.")
+        return len(done)
+
+    def _pipeline(self, mailbox):
+        if mailbox not in self._pipelines:
+            from pipeline import NewsletterPipeline
+            from run_journal import RunJournal
+
+            config = self.mailboxes[mailbox]
+            gmail = GmailClient(token_file=config["token_file"], sync_state_file=config["sync_state_file"])
+            # Per-mailbox journal: a message that was half-processed when its lease
+            # expired resumes from its last completed stage on whichever worker picks it up
+            journal = RunJournal(path=config["journal_path"])
+            guard = LeaseGuard(self.queue, self.worker_id, mailbox)
+            self._pipelines[mailbox] = (NewsletterPipeline(gmail, self.llm, self.notion, journal=journal, label_guard=guard), guard)
+        return self._pipelines[mailbox]
+
+    def _start_day(self):
+        """
+        Drops state a --forever worker would otherwise keep growing (labelled ids,
+        per-article Notion locks, stale LLM cache entries, trace spans), and the
+        duplicate clusters, so today's stories aren't merged into yesterday's.
+        """
+        self._day = date.today()
+        tracer.report()
+        tracer.reset()
+        for pipeline, _ in self._pipelines.values():
+            pipeline.gmail.forget_labelled()
+            if pipeline.dedup:
+                pipeline.dedup.clear()
+        self.notion.clear_article_locks()
+        if self.llm.cache:
+            self.llm.cache.evict()
+
+    def _heartbeat(self):
+        # Renew well before expiry so a slow batch doesn't lose its lease
+        interval = self.queue.lease_seconds / 3
+        while not self._stop.wait(interval):
+            try:
+                self.queue.renew(self.worker_id)
+            except Exception as e:
+                print(f"Lease renewal failed: {e}")
+
+def enqueue(args):
+    """
+    Coordinator: lists new newsletters in every mailbox and queues them.
+    """
+    queue = WorkQueue()
+    for mailbox in load_mailboxes(args.mailboxes):
+        try:
+            gmail = GmailClient(token_file=mailbox["token_file"], sync_state_file=mailbox["sync_state_file"])
+            msg_ids = [msg["id"] for msg in gmail.search_newsletters(limit=args.limit)]
+            added = queue.enqueue(mailbox["name"], msg_ids)
+            gmail.save_sync_state()
+        except Exception as e:
+            print(f"[{mailbox['name']}] Enqueue failed: {e}")
+            continue
+        print(f"[{mailbox['name']}] Listed {len(msg_ids)} newsletters, {added} newly queued.")
+    queue.prune()
+
+def work(args):
+    worker = QueueWorker(WorkQueue(), load_mailboxes(args.mailboxes), worker_id=args.worker_id, batch_size=args.batch)
+    try:
+        worker.run(forever=args.forever)
+    except KeyboardInterrupt:
+        worker.stop()
+
+def status(args):
+    for mailbox, counts in sorted(WorkQueue().stats().items()):
+        print(f"{mailbox}: " + ", ".join(f"{count} {state}" for state, count in sorted(counts.items())))
+
+def summarize(args):
+    """
+    Writes one daily summary covering the newsletters completed in all mailboxes.
+    """
+    from notion_agent import NotionAgent
+    from run_journal import RunJournal
+
+    queue = WorkQueue()
+    pending = queue.pending_summary()
+    if not pending:
+        print("No newsletters to summarize.")
+        return
+    newsletters = [newsletter for _, newsletter in pending]
+    print(f"Creating Daily Summary Page ({len(newsletters)} newsletters)...")
+    if not NotionAgent().create_daily_summary(newsletters):
+        return
+    queue.mark_summarized([(mailbox, newsletter["id"]) for mailbox, newsletter in pending])
+
+    # Keep each mailbox's journal in step, so its entries don't stay at "labelled"
+    journal_paths = {mailbox["name"]: mailbox["journal_path"] for mailbox in load_mailboxes(args.mailboxes)}
+    by_mailbox = {}
+    for mailbox, newsletter in pending:
+        by_mailbox.setdefault(mailbox, []).append(newsletter["id"])
+    for mailbox, msg_ids in by_mailbox.items():
+        if mailbox in journal_paths:
+            RunJournal(path=journal_paths[mailbox]).record_summarized(msg_ids)
+
+def main():
+    parser = argparse.ArgumentParser(description="Process several mailboxes through a shared, leased work queue.")
+    parser.add_argument("--mailboxes", help="mailbox list (default: MAILBOXES_FILE or mailboxes.json)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = commands.add_parser("enqueue", help="list new newsletters in every mailbox and queue them")
+    enqueue_parser.add_argument("--limit", type=int, help="max messages to list per mailbox")
+    enqueue_parser.set_defaults(func=enqueue)
+
+    work_parser = commands.add_parser("work", help="process queued messages (run one per worker)")
+    work_parser.add_argument("--forever", action="store_true", help="keep polling instead of exiting when the queue is empty")
+    work_parser.add_argument("--batch", type=int, help="messages leased at a time (default: QUEUE_LEASE_BATCH or 10)")
+    work_parser.add_argument("--worker-id", help="lease owner name (default: hostname:pid)")
+    work_parser.set_defaults(func=work)
+
+    status_parser = commands.add_parser("status", help="job counts per mailbox and state")
+    status_parser.set_defaults(func=status)
+
+    summarize_parser = commands.add_parser("summarize", help="write the daily summary for completed messages")
+    summarize_parser.set_defaults(func=summarize)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -8,80 +8,98 @@ try:
 except ImportError:
     pass
 
-import time
+import os
+import itertools
 from gmail_client import GmailClient
 from notion_agent import NotionAgent
 from llm_processor import LLMProcessor
+from pipeline import NewsletterPipeline
+from run_journal import RunJournal
+from instrumentation import tracer
 
 def main():
     print("Starting Newsletter Digest Agent...")
     
-    # 1. Initialize Components
+    # 1. Initialize Components (Notion and Gemini clients wait until there is work for them)
     try:
         gmail = GmailClient()
-        notion = NotionAgent()
-        llm = LLMProcessor()
+        # Crash-resumable progress record (fetched/extracted/published/labelled per message)
+        journal = RunJournal() if os.environ.get("RUN_JOURNAL_ENABLED", "true").lower() == "true" else None
     except Exception as e:
         print(f"Initialization failed: {e}")
         return
 
-    # 2. Find Newsletters
+    # 2. Find Newsletters (streamed page by page)
     print("Searching for newsletters...")
     messages = gmail.search_newsletters()
+    first = next(messages, None)
+    # Newsletters an earlier run labelled but never got into a summary
+    recovered = journal.pending_summary() if journal else []
     
-    if not messages:
+    if first is None and not recovered:
         print("No new newsletters found.")
+        gmail.save_sync_state()
         return
 
-    print(f"Found {len(messages)} newsletters to process.")
-    
-    processed_newsletters = []
+    try:
+        notion = NotionAgent()
+        llm = LLMProcessor()
+    except Exception as e:
+        print(f"Initialization failed: {e}")
+        return
 
-    # 3. Process Each Newsletter
-    for msg in messages:
+    # Streaming mode writes each newsletter to the summary page as soon as it is processed
+    summary_writer = None
+    if os.environ.get("NOTION_STREAMING_SUMMARY", "false").lower() == "true":
         try:
-            details = gmail.get_email_details(msg['id'])
-            print(f"Processing: {details['subject']}...")
-            
-            # Determine Newsletter Name (Simple heuristic: Sender Name)
-            # "Sender Name <email@example.com>" -> "Sender Name"
-            sender_name = details['sender'].split('<')[0].strip().replace('"', '')
-            
-            # Extract Articles via LLM
-            articles = llm.process_newsletter(details['subject'], details['body'], newsletter_name=sender_name)
-            
-            if not articles:
-                print(f"  - No articles extracted from {details['subject']}. Skipping.")
-                continue
-                
-            print(f"  - Extracted {len(articles)} articles.")
-            
-            # Create Notion Entries for Articles
-            for article in articles:
-                notion_id = notion.create_article_entry(article)
-                article['notion_id'] = notion_id
-                print(f"    - Created article: {article['title']}")
-            
-            # Add to list for Daily Summary
-            processed_newsletters.append({
-                "name": sender_name,
-                "subject": details['subject'],
-                "articles": articles
-            })
-            
-            # Mark as Processed
-            gmail.add_label(msg['id'], "Agent/newsletter processed")
-            
+            summary_writer = notion.start_daily_summary()
         except Exception as e:
-            print(f"Error processing message {msg['id']}: {e}")
+            print(f"Could not start streaming summary, falling back to end-of-run summary: {e}")
+
+    # 3. Process Newsletters (fetch, extract and publish concurrently while later pages are listed)
+    pipeline = NewsletterPipeline(
+        gmail, llm, notion,
+        on_newsletter=summary_writer.append_newsletter if summary_writer else None,
+        journal=journal
+    )
+    try:
+        processed_newsletters = pipeline.run(itertools.chain([first], messages)) if first is not None else []
+    finally:
+        pipeline.close()
+
+    processed_ids = {newsletter['id'] for newsletter in processed_newsletters}
+    recovered = [newsletter for newsletter in recovered if newsletter['id'] not in processed_ids]
+    if recovered:
+        print(f"Recovered {len(recovered)} newsletters from an interrupted run.")
+        if summary_writer:
+            for newsletter in recovered:
+                summary_writer.append_newsletter(newsletter)
+        processed_newsletters = recovered + processed_newsletters
+
+    # Remember where this run stopped (incremental sync only)
+    gmail.save_sync_state()
+
+    print(llm.token_stats())
+    if llm.cache:
+        print(llm.cache.stats())
 
     # 4. Create Daily Summary
-    if processed_newsletters:
+    if summary_writer:
+        written_ids = summary_writer.finish()
+        print(f"Daily Summary complete ({len(written_ids)} newsletters).")
+        if journal:
+            journal.record_summarized(written_ids)
+    elif processed_newsletters:
         print("Creating Daily Summary Page...")
-        notion.create_daily_summary(processed_newsletters)
+        page_id = notion.create_daily_summary(processed_newsletters)
+        if page_id and journal:
+            journal.record_summarized([newsletter['id'] for newsletter in processed_newsletters])
         print("Done!")
     else:
         print("No newsletters were successfully processed.")
 
+    # Per-stage latencies, API call counts and token totals (also appended to run_trace.jsonl)
+    tracer.report()
+
 if __name__ == "__main__":
     main()
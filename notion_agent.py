@@ -1,24 +1,133 @@
 import os
-from notion_client import Client
+import re
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from datetime import datetime
+from rate_limit import TokenBucket
+from notion_index import ArticleIndex
+from article_dedup import unique_articles
+from summary_layout import STREAMING_LAYOUTS, choose_layout, summary_blocks, chunk_blocks
+from instrumentation import tracer
 
 load_dotenv()
 
+# Notion allows an average of 3 requests per second per integration
+NOTION_REQUESTS_PER_SECOND = 3
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+def span_name(method):
+    """
+    Trace name for a notion-client endpoint method, e.g. "notion.pages.create".
+    """
+    endpoint = type(getattr(method, "__self__", None)).__name__.replace("Endpoint", "")
+    endpoint = re.sub(r"(?<!^)(?=[A-Z])", "_", endpoint).lower()
+    return f"notion.{endpoint}.{getattr(method, '__name__', 'call')}"
+
+def summary_title(date=None):
+    today_str = (date or datetime.now()).strftime("%B %d, %Y")
+    return f"Newsletter Digest - {today_str}"
+
+def plain_text(rich_text):
+    """
+    Concatenates the plain text of a Notion rich_text array.
+    """
+    return "".join(item.get("plain_text") or item.get("text", {}).get("content", "") for item in rich_text)
+
 class NotionAgent:
-    def __init__(self):
-        self.notion = Client(auth=os.environ["NOTION_API_KEY"])
+    def __init__(self, client=None):
+        """
+        client: optional notion_client.Client-compatible object, e.g. a local
+        stand-in for benchmarks.
+        """
+        if client is None:
+            # Imported on first use: notion_client pulls in httpx, which the no-work path never needs
+            from notion_client import Client
+            client = Client(auth=os.environ["NOTION_API_KEY"])
+        self.notion = client
         self.articles_db_id = os.environ["NOTION_ARTICLES_DB_ID"]
         self.summary_db_id = os.environ["NOTION_SUMMARY_DB_ID"]
 
+        # Shared by every Notion call so concurrent writers stay under the API limit
+        rps = float(os.environ.get("NOTION_REQUESTS_PER_SECOND", NOTION_REQUESTS_PER_SECOND))
+        self.rate_limiter = TokenBucket(rps * 60, capacity=max(1, int(rps)))
+        self.max_concurrency = int(os.environ.get("NOTION_MAX_CONCURRENCY", 3))
+        self.max_retries = int(os.environ.get("NOTION_MAX_RETRIES", 5))
+
+        # Local URL/content -> page id index for idempotent article creation
+        self.index = None
+        if os.environ.get("NOTION_INDEX_ENABLED", "true").lower() == "true":
+            self.index = ArticleIndex()
+        self._article_locks = {}
+        self._article_locks_guard = threading.Lock()
+
+    def _call(self, method, **kwargs):
+        """
+        Calls a Notion API method under the shared rate limiter, retrying
+        rate-limited (429) and transient 5xx responses, timeouts and connection errors.
+        Honors the Retry-After header when Notion sends one.
+        """
+        import httpx
+        from notion_client.errors import HTTPResponseError, RequestTimeoutError
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                with tracer.span(span_name(method)):
+                    return method(**kwargs)
+            except HTTPResponseError as e:
+                # Includes APIResponseError and non-JSON 5xx pages from proxies
+                if e.status not in RETRYABLE_STATUSES or attempt == self.max_retries:
+                    raise
+                retry_after = (getattr(e, "headers", None) or {}).get("retry-after")
+                delay = float(retry_after) if retry_after else min(30, 2 ** attempt)
+                print(f"Notion returned {e.status}; retrying in {delay:.1f}s.")
+            except (RequestTimeoutError, httpx.TransportError) as e:
+                # httpx.TransportError covers timeouts and connection/network errors
+                if attempt == self.max_retries:
+                    raise
+                delay = min(30, 2 ** attempt)
+                print(f"Notion request failed ({type(e).__name__}); retrying in {delay:.1f}s.")
+            time.sleep(delay)
+
     def create_article_entry(self, article):
         """
         Creates a page in the Articles Database.
+        If the article was already published (same normalized URL or content),
+        the existing page id is returned instead of creating a duplicate.
         """
+        if not self.index:
+            return self._create_article_page(article)
+
+        # Serialize concurrent upserts of the same article within a run
+        with self._article_lock(article):
+            existing = self.index.get(article)
+            if existing:
+                print(f"    - Already in Notion, reusing page: {article['title']}")
+                return existing
+            page_id = self._create_article_page(article)
+            if page_id:
+                self.index.add(article, page_id)
+            return page_id
+
+    def _article_lock(self, article):
+        key = ArticleIndex.keys_for(article)[0]
+        with self._article_locks_guard:
+            return self._article_locks.setdefault(key, threading.Lock())
+
+    def clear_article_locks(self):
+        """
+        Forgets the per-article locks; call between runs in long-running processes.
+        """
+        with self._article_locks_guard:
+            self._article_locks.clear()
+
+    def _create_article_page(self, article):
         try:
             properties = {
                 "Article Title": {"title": [{"text": {"content": article["title"]}}]},
-                "Newsletter Name": {"rich_text": [{"text": {"content": article["newsletter_name"]}}]},
+                "Newsletter Name": self._sources_property(article),
                 "Newsletter Subject Line": {"rich_text": [{"text": {"content": article["newsletter_subject"]}}]},
                 "Article Link": {"url": article["url"]},
                 "Summary": {"rich_text": [{"text": {"content": article["summary"]}}]},
@@ -43,7 +152,8 @@ class NotionAgent:
                     "bulleted_list_item": {"rich_text": [{"text": {"content": takeaway}}]}
                 })
 
-            response = self.notion.pages.create(
+            response = self._call(
+                self.notion.pages.create,
                 parent={"database_id": self.articles_db_id},
                 properties=properties,
                 children=children
@@ -53,113 +163,101 @@ class NotionAgent:
             print(f"Error creating article entry: {e}")
             return None
 
-    def create_daily_summary(self, processed_newsletters):
+    def update_article_sources(self, article):
+        """
+        Rewrites a published article's Newsletter Name once newsletters merged into it
+        after its page was created. Returns True on success.
+        """
+        # Same lock as creation, so concurrent updates of one page land in order
+        with self._article_lock(article):
+            try:
+                self._call(self.notion.pages.update, page_id=article["notion_id"],
+                           properties={"Newsletter Name": self._sources_property(article)})
+                return True
+            except Exception as e:
+                print(f"Error updating sources of {article['title']}: {e}")
+                return False
+
+    def _sources_property(self, article):
+        names = ", ".join(article.get("sources") or [article["newsletter_name"]])
+        return {"rich_text": [{"text": {"content": names}}]}
+
+    def create_article_entries(self, articles):
+        """
+        Creates pages for many articles concurrently under the shared rate limiter.
+        Returns the page ids in input order (None for articles that failed).
+        """
+        if len(articles) <= 1:
+            return [self.create_article_entry(article) for article in articles]
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="notion") as pool:
+            return list(pool.map(tracer.wrap(self.create_article_entry), articles))
+
+    def bootstrap_index(self, rebuild=False):
+        """
+        Loads existing Articles DB entries into the local index via paginated
+        databases.query, so articles published before the index existed are deduplicated too.
+        """
+        if not self.index:
+            self.index = ArticleIndex()
+        if rebuild:
+            self.index.clear()
+
+        loaded = 0
+        for page in self.iter_article_pages():
+            props = page.get("properties", {})
+            article = {
+                "title": plain_text(props.get("Article Title", {}).get("title", [])),
+                "summary": plain_text(props.get("Summary", {}).get("rich_text", [])),
+                "url": props.get("Article Link", {}).get("url"),
+            }
+            self.index.add(article, page["id"])
+            loaded += 1
+            if loaded % 100 == 0:
+                print(f"Indexed {loaded} articles...")
+
+        print(f"Indexed {loaded} existing articles ({self.index.count()} pages in index).")
+        return loaded
+
+    def iter_article_pages(self):
+        """
+        Yields every page of the Articles DB, following databases.query pagination.
+        """
+        cursor = None
+        while True:
+            kwargs = {"database_id": self.articles_db_id, "page_size": 100}
+            if cursor:
+                kwargs["start_cursor"] = cursor
+            response = self._call(self.notion.databases.query, **kwargs)
+            yield from response.get("results", [])
+            if not response.get("has_more"):
+                break
+            cursor = response.get("next_cursor")
+
+    def create_daily_summary(self, processed_newsletters, date=None):
         """
         Creates a daily summary page.
         processed_newsletters: List of dicts, each containing 'name', 'subject', 'articles' (list of article dicts)
+        date: the day the summary covers (datetime.date), default today; set by backfills.
+        Returns the page id, or None if the summary could not be written.
         """
-        today_str = datetime.now().strftime("%B %d, %Y")
-        title = f"Newsletter Digest - {today_str}"
-        
-        total_articles = sum(len(n["articles"]) for n in processed_newsletters)
-        
-        properties = {
-            "Title": {"title": [{"text": {"content": title}}]},
-            "Date": {"date": {"start": datetime.now().strftime("%Y-%m-%d")}},
-            "Number of Newsletters": {"number": len(processed_newsletters)},
-            "Number of Articles": {"number": total_articles}
-        }
+        title = summary_title(date)
+        total_articles = sum(len(unique_articles(n)) for n in processed_newsletters)
+        properties = self._summary_properties(title, len(processed_newsletters), total_articles, date)
 
-        children = []
-        
         # Header (Removed as per request to avoid duplication with page title)
-        # children.append({
-        #     "object": "block",
-        #     "type": "heading_1",
-        #     "heading_1": {"rich_text": [{"text": {"content": title}}]}
-        # })
-
-        for newsletter in processed_newsletters:
-            # Newsletter Section Header
-            header_text = f"{newsletter['name']} - {newsletter['subject']}"
-            children.append({
-                "object": "block",
-                "type": "heading_2",
-                "heading_2": {"rich_text": [{"text": {"content": header_text}}]}
-            })
-
-            for article in newsletter['articles']:
-                # Article Title Line: 💥 [Title](url) [link to DB]
-                icon = "💥 " if article.get('must_read', False) else ""
-                
-                # Ensure URL is valid string
-                article_url = article.get('url')
-                if not article_url:
-                    article_url = "https://example.com" # Fallback
-
-                text_content = [
-                    {"type": "text", "text": {"content": icon}},
-                    {"type": "text", "text": {"content": article['title'], "link": {"url": article_url}}},
-                    {"type": "text", "text": {"content": " "}},
-                ]
-                
-                # Add link to Notion DB entry if we have the ID
-                if article.get('notion_id'):
-                    # Notion app link format or just a text indicator? 
-                    # The prompt asks for "link to Articles DB entry". 
-                    # We can't easily get the public URL of the new page immediately without an extra call, 
-                    # but we can try to mention it or just link to the DB.
-                    # For now, let's just add a text marker.
-                    text_content.append({
-                        "type": "text", 
-                        "text": {"content": "[View in DB]", "link": {"url": f"https://notion.so/{article['notion_id'].replace('-', '')}"}}
-                    })
 
-                children.append({
-                    "object": "block",
-                    "type": "paragraph",
-                    "paragraph": {"rich_text": text_content}
-                })
-
-                # Summary
-                children.append({
-                    "object": "block",
-                    "type": "paragraph",
-                    "paragraph": {"rich_text": [{"text": {"content": article['summary']}}]}
-                })
+        # NOTION_SUMMARY_LAYOUT (full unless set; auto picks the one with the fewest API calls)
+        layout, cost = choose_layout(processed_newsletters)
+        print(f"Summary layout: {layout} ({cost['blocks']} blocks, {cost['bytes'] // 1024} KB, {cost['requests']} requests)")
 
-                # Key Takeaways
-                children.append({
-                    "object": "block",
-                    "type": "paragraph",
-                    "paragraph": {"rich_text": [{"text": {"content": "Key Takeaways:"}, "annotations": {"bold": True}}]}
-                })
-                
-                for takeaway in article['takeaways']:
-                    children.append({
-                        "object": "block",
-                        "type": "bulleted_list_item",
-                        "bulleted_list_item": {"rich_text": [{"text": {"content": takeaway}}]}
-                    })
-                
-                # Spacer
-                children.append({"object": "block", "type": "paragraph", "paragraph": {"rich_text": []}})
-
-            # Divider between newsletters
-            children.append({"object": "block", "type": "divider", "divider": {}})
-
-        # Chunking for 100 block limit
-        def chunk_list(lst, n):
-            for i in range(0, len(lst), n):
-                yield lst[i:i + n]
-
-        chunks = list(chunk_list(children, 100))
-        first_chunk = chunks[0] if chunks else []
-        remaining_chunks = chunks[1:] if len(chunks) > 1 else []
+        # Blocks are generated lazily and sent in chunks within Notion's per-request limits
+        chunks = chunk_blocks(summary_blocks(processed_newsletters, layout))
+        first_chunk = next(chunks, [])
 
         try:
             # Create page with first chunk
-            response = self.notion.pages.create(
+            response = self._call(
+                self.notion.pages.create,
                 parent={"database_id": self.summary_db_id},
                 properties=properties,
                 children=first_chunk
@@ -168,15 +266,125 @@ class NotionAgent:
             print(f"Created Daily Summary page: {title}")
 
             # Append remaining chunks
-            for i, chunk in enumerate(remaining_chunks):
-                print(f"Appending chunk {i+1} of {len(remaining_chunks)}...")
-                self.notion.blocks.children.append(
+            for i, chunk in enumerate(chunks):
+                print(f"Appending chunk {i+1}...")
+                self._call(
+                    self.notion.blocks.children.append,
                     block_id=page_id,
                     children=chunk
                 )
+            return page_id
             
         except Exception as e:
             print(f"Error creating daily summary: {e}")
+            return None
+
+    def start_daily_summary(self):
+        """
+        Streaming alternative to create_daily_summary: creates (or reopens) today's
+        summary page up front and returns a writer that appends each newsletter
+        as soon as it has been processed.
+        """
+        return DailySummaryWriter(self)
+
+    def _summary_properties(self, title, newsletter_count, article_count, date=None):
+        return {
+            "Title": {"title": [{"text": {"content": title}}]},
+            "Date": {"date": {"start": (date or datetime.now()).strftime("%Y-%m-%d")}},
+            "Number of Newsletters": {"number": newsletter_count},
+            "Number of Articles": {"number": article_count}
+        }
+
+class DailySummaryWriter:
+    """
+    Appends newsletters to today's summary page as they finish processing.
+    Progress (page id, chunks appended per newsletter) is saved to a local state
+    file after every append, so a rerun on the same day reopens the same page and
+    skips what was already written instead of duplicating it.
+    """
+    def __init__(self, agent):
+        self.agent = agent
+        self.state_file = os.environ.get("NOTION_SUMMARY_STATE_FILE", "summary_state.json")
+        self._lock = threading.Lock()
+
+        today = datetime.now().strftime("%Y-%m-%d")
+        state = self._load_state()
+        if state.get("date") != today:
+            state = {"date": today, "page_id": None, "newsletters": {}}
+        self.state = state
+
+        self.title = summary_title()
+        if not self.state["page_id"]:
+            response = agent._call(
+                agent.notion.pages.create,
+                parent={"database_id": agent.summary_db_id},
+                properties=agent._summary_properties(self.title, 0, 0),
+                children=[]
+            )
+            self.state["page_id"] = response["id"]
+            self._save_state()
+            print(f"Created Daily Summary page: {self.title}")
+        else:
+            print(f"Resuming Daily Summary page: {self.title}")
+
+    @property
+    def page_id(self):
+        return self.state["page_id"]
+
+    def append_newsletter(self, newsletter):
+        """
+        Appends one processed newsletter ('id', 'name', 'subject', 'articles').
+        Safe to call from pipeline worker threads; appends are serialized so each
+        newsletter's blocks stay contiguous on the page.
+        """
+        key = newsletter.get("id") or f"{newsletter['name']} - {newsletter['subject']}"
+        with self._lock:
+            progress = self.state["newsletters"].setdefault(key, {"chunks": 0, "done": False, "articles": len(unique_articles(newsletter))})
+            if progress["done"]:
+                return
+
+            try:
+                layout, _ = choose_layout([newsletter], STREAMING_LAYOUTS)
+                chunks = chunk_blocks(summary_blocks([newsletter], layout))
+                for i, chunk in enumerate(chunks):
+                    # Skip chunks a previous (crashed) run already appended
+                    if i < progress["chunks"]:
+                        continue
+                    self.agent._call(self.agent.notion.blocks.children.append, block_id=self.page_id, children=chunk)
+                    progress["chunks"] = i + 1
+                    self._save_state()
+                progress["done"] = True
+                self._save_state()
+                print(f"  - Added {newsletter['name']} to Daily Summary.")
+            except Exception as e:
+                print(f"Error appending {newsletter['name']} to daily summary: {e}")
+
+    def finish(self):
+        """
+        Updates the page's newsletter/article counts once the run is over.
+        Returns the ids of the newsletters written to the page.
+        """
+        with self._lock:
+            written = [n for n in self.state["newsletters"].values() if n["done"]]
+            try:
+                self.agent._call(
+                    self.agent.notion.pages.update,
+                    page_id=self.page_id,
+                    properties=self.agent._summary_properties(self.title, len(written), sum(n["articles"] for n in written))
+                )
+            except Exception as e:
+                print(f"Error updating daily summary counts: {e}")
+            return [key for key, n in self.state["newsletters"].items() if n["done"]]
+
+    def _load_state(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        with open(self.state_file) as f:
+            return json.load(f)
+
+    def _save_state(self):
+        with open(self.state_file, "w") as f:
+            json.dump(self.state, f, indent=2)
 
 if __name__ == "__main__":
     # Test
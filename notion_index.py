@@ -0,0 +1,92 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from urllib.parse import urlsplit, urlunsplit
+from content_preprocessor import canonicalize_url, unwrap_redirect
+
+# Host of the placeholder link the summary uses for articles without a URL
+PLACEHOLDER_HOST = "example.com"
+
+class ArticleIndex:
+    """
+    Local SQLite index of articles already published to Notion.
+    Maps a normalized article URL (and a content hash, for articles without
+    a usable URL) to the Notion page id, so reruns and repeat mentions reuse
+    the existing page instead of creating a duplicate.
+    """
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("NOTION_INDEX_PATH", "notion_index.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            " key TEXT PRIMARY KEY,"
+            " page_id TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def keys_for(article):
+        """
+        Lookup keys for an article, most specific first.
+        """
+        keys = []
+        url = normalize_url(article.get("url"))
+        if url:
+            keys.append(f"url:{url}")
+        content = "\x1f".join([
+            re.sub(r"\s+", " ", article.get("title") or "").strip().lower(),
+            re.sub(r"\s+", " ", article.get("summary") or "").strip().lower(),
+        ])
+        keys.append("content:" + hashlib.sha256(content.encode("utf-8")).hexdigest())
+        return keys
+
+    def get(self, article):
+        """
+        Returns the Notion page id for an already-published article, or None.
+        """
+        with self._lock:
+            for key in self.keys_for(article):
+                row = self._conn.execute("SELECT page_id FROM articles WHERE key = ?", (key,)).fetchone()
+                if row:
+                    return row[0]
+        return None
+
+    def add(self, article, page_id):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO articles (key, page_id, created_at) VALUES (?, ?, ?)",
+                [(key, page_id, now) for key in self.keys_for(article)]
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM articles")
+            self._conn.commit()
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(DISTINCT page_id) FROM articles").fetchone()[0]
+
+def normalize_url(url):
+    """
+    Canonical form of an article URL for deduplication: redirect wrappers resolved,
+    tracking parameters, fragment, 'www.' and trailing slashes removed, scheme/host lower-cased.
+    Returns None for missing or placeholder URLs.
+    """
+    if not url or not url.startswith(("http://", "https://")):
+        return None
+    parts = urlsplit(canonicalize_url(unwrap_redirect(url.strip())))
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if host == PLACEHOLDER_HOST:
+        return None
+    path = parts.path.rstrip("/")
+    return urlunsplit(("https", host, path, parts.query, ""))
@@ -0,0 +1,379 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from gmail_client import PROCESSED_LABEL
+from run_journal import FETCHED, EXTRACTED, PUBLISHED, SUMMARIZED
+from article_dedup import ArticleDeduplicator, unique_articles
+from triage import TriageRules
+from article_archive import ArticleArchive
+from instrumentation import tracer
+
+def newsletter_name(details):
+    """
+    Determine Newsletter Name (Simple heuristic: Sender Name)
+    "Sender Name <email@example.com>" -> "Sender Name"
+    """
+    return details['sender'].split('<')[0].strip().replace('"', '')
+
+def batch_input(details):
+    """
+    Shapes fetched email details for LLMProcessor.process_newsletters_batch.
+    """
+    return {
+        "id": details['id'],
+        "subject": details['subject'],
+        "body": details['body'],
+        "newsletter_name": newsletter_name(details)
+    }
+
+class NewsletterPipeline:
+    """
+    Staged concurrent pipeline: Gmail fetch -> LLM extraction -> Notion publish -> label.
+    Each stage has its own concurrency limit so fetches, Gemini calls and Notion
+    writes overlap instead of running one newsletter at a time.
+    """
+    def __init__(self, gmail, llm, notion, fetch_workers=None, extract_workers=None, publish_workers=None, on_newsletter=None, journal=None, label_guard=None, date=None):
+        self.gmail = gmail
+        self.llm = llm
+        self.notion = notion
+        # Optional RunJournal: resume from recorded fetch/extract/publish results
+        self.journal = journal
+        # Called with each processed newsletter as soon as it is published (e.g. DailySummaryWriter.append_newsletter)
+        self.on_newsletter = on_newsletter
+        # Optional gate around labelling (e.g. a work-queue lease): claim(ids) returns
+        # the ids this process may still label, labelled(ids) is told which ones it did
+        self.label_guard = label_guard
+        # Day the newsletters are filed under in the archive (datetime.date; default: today)
+        self.date = date
+
+        self.fetch_workers = fetch_workers or int(os.environ.get("PIPELINE_FETCH_WORKERS", 4))
+        self.extract_workers = extract_workers or int(os.environ.get("PIPELINE_EXTRACT_WORKERS", 4))
+        self.publish_workers = publish_workers or int(os.environ.get("PIPELINE_PUBLISH_WORKERS", 3))
+        self.fetch_batch_size = int(os.environ.get("PIPELINE_FETCH_BATCH_SIZE", 25))
+
+        # Merges the same story covered by several newsletters into one article
+        self.dedup = None
+        if os.environ.get("ARTICLE_DEDUP_ENABLED", "true").lower() == "true":
+            self.dedup = ArticleDeduplicator()
+
+        # Header/size-based skipping before full bodies are downloaded
+        self.triage = None
+        if os.environ.get("TRIAGE_ENABLED", "true").lower() == "true":
+            self.triage = TriageRules()
+
+        # Local full-text archive of everything published
+        self.archive = None
+        if os.environ.get("ARCHIVE_ENABLED", "true").lower() == "true":
+            self.archive = ArticleArchive()
+
+        # Per-stage slots; worker threads hold a slot only while calling that service
+        self._extract_slots = threading.BoundedSemaphore(self.extract_workers)
+        self._publish_slots = threading.BoundedSemaphore(self.publish_workers)
+
+        # Worker pools are created on the first run and reused by later ones, so in a
+        # long-running process the threads (and the Gmail service each one holds) stay warm
+        self._fetch_pool = None
+        self._work_pool = None
+
+    def run(self, messages):
+        """
+        Processes Gmail message stubs concurrently.
+        `messages` may be any iterable, including the streaming search generator:
+        fetching starts as soon as the first chunk of ids has been listed.
+        Returns the processed newsletters in listing order,
+        ready for NotionAgent.create_daily_summary.
+        """
+        results = {}
+        # Messages triage decided not to fetch; labelled along with the processed ones
+        skipped = []
+        listed = 0
+        fetch_pool, work_pool = self._pools()
+        fetches = []
+        work = []
+
+        try:
+            # Fetch in batched chunks so a day's newsletters cost a few HTTP round trips
+            chunk = []
+            for index, msg in enumerate(messages):
+                listed += 1
+                chunk.append((index, msg))
+                if len(chunk) == self.fetch_batch_size:
+                    fetches.append(fetch_pool.submit(self._fetch_chunk, chunk, work_pool, results, skipped))
+                    chunk = []
+            if chunk:
+                fetches.append(fetch_pool.submit(self._fetch_chunk, chunk, work_pool, results, skipped))
+
+            print(f"Listed {listed} newsletters to process.")
+
+            for future in fetches:
+                work.extend(future.result())
+            wait(work)
+        except BaseException:
+            # Nothing from a failed run may still be running when the pools are reused
+            wait(fetches)
+            wait([future for fetch in fetches if fetch.exception() is None for future in fetch.result()])
+            raise
+
+        # Mark as Processed
+        self._mark_processed([msg_id for future in work for msg_id in future.result()] + skipped)
+
+        return [results[index] for index in sorted(results)]
+
+    def _pools(self):
+        if self._fetch_pool is None:
+            self._fetch_pool = ThreadPoolExecutor(max_workers=self.fetch_workers, thread_name_prefix="fetch")
+            self._work_pool = ThreadPoolExecutor(max_workers=self.extract_workers + self.publish_workers,
+                                                 thread_name_prefix="work")
+        return self._fetch_pool, self._work_pool
+
+    def close(self):
+        """
+        Shuts down the worker pools once the pipeline is no longer needed.
+        """
+        for pool in (self._fetch_pool, self._work_pool):
+            if pool is not None:
+                pool.shutdown()
+        self._fetch_pool = None
+        self._work_pool = None
+
+    def _fetch_chunk(self, chunk, work_pool, results, skipped):
+        """
+        Fetches a chunk of messages in one batch request and hands each one
+        to the extract/publish stage as soon as the chunk arrives.
+        Returns the submitted work futures.
+        """
+        # Messages a previous run already got further with skip the Gmail fetch
+        entries = {msg['id']: self._journal_entry(msg['id']) for _, msg in chunk}
+        fetched = {msg_id: entry['details'] for msg_id, entry in entries.items() if self._reached(entry, FETCHED)}
+
+        to_fetch = [msg['id'] for _, msg in chunk if msg['id'] not in fetched]
+        if to_fetch and self.triage and self.triage.active:
+            to_fetch = self._triage(to_fetch, skipped)
+        if to_fetch:
+            try:
+                for details in self.gmail.get_email_details_batch(to_fetch):
+                    fetched[details['id']] = details
+                    if self.journal:
+                        self.journal.record_fetched(details['id'], details)
+            except Exception as e:
+                print(f"Error fetching messages {to_fetch}: {e}")
+
+        items = [(index, msg, fetched[msg['id']]) for index, msg in chunk if msg['id'] in fetched]
+
+        if self.llm.batch_mode:
+            # Pack short newsletters into shared Gemini requests; journaled ones don't need the LLM
+            resumed = [item for item in items if self._reached(entries[item[1]['id']], EXTRACTED)]
+            fresh = [item for item in items if not self._reached(entries[item[1]['id']], EXTRACTED)]
+            by_id = {details['id']: (index, msg, details) for index, msg, details in fresh}
+            newsletters = [batch_input(details) for _, _, details in fresh]
+            return [
+                work_pool.submit(self._process_batch, [by_id[n['id']] for n in batch], results)
+                for batch in self.llm.pack_batches(newsletters)
+            ] + [work_pool.submit(self._process_message, index, msg, details, results) for index, msg, details in resumed]
+
+        return [work_pool.submit(self._process_message, index, msg, details, results) for index, msg, details in items]
+
+    def _triage(self, msg_ids, skipped):
+        """
+        Fetches headers and sizes only, and returns the ids worth downloading in full.
+        Skipped ids are added to `skipped`. If the metadata fetch fails, everything is fetched.
+        """
+        try:
+            with tracer.span("pipeline.triage", items=len(msg_ids)):
+                metadata = self.gmail.get_email_metadata_batch(msg_ids)
+        except Exception as e:
+            print(f"Triage failed ({e}), fetching all messages.")
+            return msg_ids
+
+        rejected = set()
+        for meta in metadata:
+            reason = self.triage.check(meta)
+            if reason:
+                print(f"Skipping {meta['subject']}: {reason}.")
+                rejected.add(meta['id'])
+        skipped.extend(rejected)
+        return [msg_id for msg_id in msg_ids if msg_id not in rejected]
+
+    def _journal_entry(self, msg_id):
+        return self.journal.get(msg_id) if self.journal else None
+
+    def _reached(self, entry, stage):
+        return self.journal is not None and self.journal.reached(entry, stage)
+
+    def _process_message(self, index, msg, details, results):
+        """
+        Extracts and publishes a single fetched newsletter.
+        Returns the ids of messages to label as processed.
+        Errors are isolated to this message, matching the serial loop's behaviour.
+        """
+        with tracer.message(msg['id']):
+            return self._extract_and_publish(index, msg, details, results)
+
+    def _extract_and_publish(self, index, msg, details, results):
+        try:
+            print(f"Processing: {details['subject']}...")
+
+            entry = self._journal_entry(msg['id'])
+            if self._reached(entry, SUMMARIZED):
+                # Already in a written summary (e.g. labelling failed last time): only label it
+                print("  - Already summarized by an earlier run; labelling only.")
+                return [msg['id']]
+            # Labelled messages with no articles have no published newsletter to reuse
+            if self._reached(entry, PUBLISHED) and entry['newsletter']:
+                print("  - Already published by an earlier run; reusing journal entry.")
+                if self.dedup:
+                    for article in unique_articles(entry['newsletter']):
+                        self.dedup.add(article)
+                return self._record_result(index, msg, entry['newsletter'], results)
+
+            if self._reached(entry, EXTRACTED):
+                print(f"  - Reusing {len(entry['articles'])} articles extracted by an earlier run.")
+                articles = entry['articles']
+            else:
+                # Extract Articles via LLM
+                with self._extract_slots, tracer.span("pipeline.extract"):
+                    articles = self.llm.process_newsletter(details['subject'], details['body'], newsletter_name=newsletter_name(details))
+                if self.journal and articles is not None:
+                    self.journal.record_extracted(msg['id'], articles)
+        except Exception as e:
+            print(f"Error processing message {msg['id']}: {e}")
+            return []
+
+        return self._publish(index, msg, details, articles, results)
+
+    def _process_batch(self, items, results):
+        """
+        Extracts several fetched newsletters with one batched LLM request,
+        then publishes each one independently.
+        """
+        try:
+            for _, _, details in items:
+                print(f"Processing: {details['subject']}...")
+
+            with self._extract_slots, tracer.span("pipeline.extract_batch", items=len(items)):
+                extracted = self.llm.process_newsletters_batch([batch_input(details) for _, _, details in items])
+        except Exception as e:
+            print(f"Error processing messages {[msg['id'] for _, msg, _ in items]}: {e}")
+            return []
+
+        if self.journal:
+            for _, msg, details in items:
+                if extracted.get(details['id']) is not None:
+                    self.journal.record_extracted(msg['id'], extracted[details['id']])
+
+        return [
+            msg_id
+            for index, msg, details in items
+            for msg_id in self._publish_traced(index, msg, details, extracted.get(details['id']), results)
+        ]
+
+    def _publish_traced(self, index, msg, details, articles, results):
+        with tracer.message(msg['id']):
+            return self._publish(index, msg, details, articles, results)
+
+    def _publish(self, index, msg, details, articles, results):
+        """
+        Creates Notion entries for a newsletter's extracted articles and records it for the summary.
+        Returns the message id (in a list) on success so it can be labelled as processed;
+        newsletters with no articles are labelled too, but left out of the summary.
+        """
+        try:
+            if articles is None:
+                # Extraction failed; left unlabelled so the next run retries it
+                return []
+            if self.triage:
+                self.triage.record_outcome(details, len(articles))
+            if not articles:
+                print(f"  - No articles extracted from {details['subject']}. Skipping.")
+                return [msg['id']]
+
+            print(f"  - Extracted {len(articles)} articles from {details['subject']}.")
+            if self.dedup:
+                self._merge_duplicates(articles)
+            new_articles = [article for article in articles if not article.get('duplicate_of')]
+            # Sources known before the pages are built; anything merged later needs an update
+            known_sources = [len(article.get('sources') or []) for article in new_articles]
+
+            # Create Notion Entries for Articles (concurrently, under Notion's rate limit)
+            with self._publish_slots, tracer.span("pipeline.publish", items=len(new_articles)):
+                notion_ids = self.notion.create_article_entries(new_articles)
+            for article, notion_id in zip(new_articles, notion_ids):
+                article['notion_id'] = notion_id
+                print(f"    - Created article: {article['title']}")
+            for article, known in zip(new_articles, known_sources):
+                if article['notion_id'] and len(article.get('sources') or []) > known:
+                    self.notion.update_article_sources(article)
+
+            # Add to list for Daily Summary
+            newsletter = {
+                "id": msg['id'],
+                "name": newsletter_name(details),
+                "subject": details['subject'],
+                "date": self.date.strftime("%Y-%m-%d") if self.date else None,
+                "articles": articles
+            }
+            if self.journal:
+                self.journal.record_published(msg['id'], newsletter)
+            if self.archive:
+                try:
+                    self.archive.add_newsletter(newsletter, date=newsletter['date'])
+                except Exception as e:
+                    print(f"Error archiving {details['subject']}: {e}")
+            return self._record_result(index, msg, newsletter, results)
+
+        except Exception as e:
+            print(f"Error processing message {msg['id']}: {e}")
+            return []
+
+    def _merge_duplicates(self, articles):
+        """
+        Marks articles already covered by another newsletter this run; they get
+        no Notion page of their own and a one-line mention in the summary.
+        Primaries already in Notion get their Newsletter Name updated with the new source.
+        """
+        for article in articles:
+            primary = self.dedup.add(article)
+            if primary is not None:
+                if primary.get('notion_id'):
+                    self.notion.update_article_sources(primary)
+                article['duplicate_of'] = {
+                    "title": primary['title'],
+                    "url": primary['url'],
+                    "newsletter_name": primary.get('newsletter_name'),
+                }
+                print(f"    - Merged duplicate: {article['title']} (also in {primary.get('newsletter_name')})")
+
+    def _record_result(self, index, msg, newsletter, results):
+        results[index] = newsletter
+        if self.on_newsletter:
+            self.on_newsletter(newsletter)
+
+        # Labelled in bulk once the run finishes
+        return [msg['id']]
+
+    def _mark_processed(self, msg_ids):
+        """
+        Labels all successfully processed messages with a single batchModify call,
+        falling back to per-message labelling if the bulk call fails.
+        """
+        if self.label_guard:
+            msg_ids = self.label_guard.claim(msg_ids)
+        if not msg_ids:
+            return
+        labelled = []
+        try:
+            self.gmail.add_label_batch(msg_ids, PROCESSED_LABEL)
+            labelled = msg_ids
+        except Exception as e:
+            print(f"Bulk labelling failed ({e}), labelling messages individually.")
+            for msg_id in msg_ids:
+                try:
+                    self.gmail.add_label(msg_id, PROCESSED_LABEL)
+                    labelled.append(msg_id)
+                except Exception as e:
+                    print(f"Error labelling message {msg_id}: {e}")
+
+        if self.journal:
+            self.journal.record_labelled(labelled)
+        if self.label_guard:
+            self.label_guard.labelled(labelled)
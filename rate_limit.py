@@ -0,0 +1,67 @@
+import time
+import threading
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Refills continuously at `rate_per_minute`
+    up to `capacity`; acquire() blocks until enough tokens are available.
+    """
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        # A single request larger than the bucket can never fit; let it through once full
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit that halves on quota errors and grows back by one
+    after a run of successes (AIMD), so parallel callers settle at the
+    highest rate the API will sustain.
+    """
+    def __init__(self, max_limit, increase_after=5):
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.increase_after = increase_after
+        self._in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.increase_after and self.limit < self.max_limit:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+
+    def on_throttled(self):
+        with self._cond:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
@@ -1,4 +1,4 @@
-from gmail_client import GmailClient
+from gmail_client import GmailClient, PROCESSED_LABEL
 
 def reset_labels():
     client = GmailClient()
@@ -7,35 +7,25 @@ def reset_labels():
     # We look for label:newsletter and label:"Agent/newsletter processed"
     query = 'label:newsletter label:"Agent/newsletter processed" newer_than:2d'
     
-    results = client.service.users().messages().list(userId="me", q=query).execute()
-    messages = results.get("messages", [])
+    messages = list(client.iter_messages(query))
     
     print(f"Found {len(messages)} messages to reset.")
     
-    # Get Label ID
-    results = client.service.users().labels().list(userId="me").execute()
-    labels = results.get("labels", [])
-    label_id = None
-    target_label = "Agent/newsletter processed"
-    for label in labels:
-        if label['name'].lower() == target_label.lower():
-            label_id = label['id']
-            break
-            
-    if not label_id:
+    target_label = PROCESSED_LABEL
+    msg_ids = [msg['id'] for msg in messages]
+
+    try:
+        # Removes the label from every message in one batchModify call per 1000 ids
+        removed = client.remove_label_batch(msg_ids, target_label) if msg_ids else True
+    except Exception as e:
+        print(f"Error resetting messages: {e}")
+        return
+
+    if not removed:
         print(f"Label '{target_label}' not found.")
         print("Available labels:")
-        for label in labels:
+        for label in client.list_labels():
             print(f"- {label['name']}")
-        return
-
-    for msg in messages:
-        try:
-            body = {'removeLabelIds': [label_id]}
-            client.service.users().messages().modify(userId="me", id=msg['id'], body=body).execute()
-            print(f"Removed label from {msg['id']}")
-        except Exception as e:
-            print(f"Error resetting {msg['id']}: {e}")
 
 if __name__ == "__main__":
     reset_labels()
@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# Per-message progress, in order
+FETCHED = "fetched"
+EXTRACTED = "extracted"
+PUBLISHED = "published"
+LABELLED = "labelled"
+SUMMARIZED = "summarized"
+STAGES = [FETCHED, EXTRACTED, PUBLISHED, LABELLED, SUMMARIZED]
+
+class RunJournal:
+    """
+    Write-ahead journal of per-message progress through the pipeline.
+    Each stage's output (fetched details, extracted articles, published
+    newsletter with Notion ids) is recorded as soon as it completes, so a
+    killed or crashed run resumes where it stopped instead of re-fetching,
+    re-extracting or re-publishing.
+    """
+    def __init__(self, path=None, retention_days=None):
+        self.path = path or os.environ.get("RUN_JOURNAL_PATH", "run_journal.sqlite3")
+        self.retention_days = retention_days or float(os.environ.get("RUN_JOURNAL_RETENTION_DAYS", 7))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " msg_id TEXT PRIMARY KEY,"
+            " stage TEXT NOT NULL,"
+            " details TEXT,"
+            " articles TEXT,"
+            " newsletter TEXT,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.prune()
+
+    def get(self, msg_id):
+        """
+        Returns the journal entry for a message as a dict
+        ('stage', 'details', 'articles', 'newsletter'), or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stage, details, articles, newsletter FROM messages WHERE msg_id = ?", (msg_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        stage, details, articles, newsletter = row
+        return {
+            "stage": stage,
+            "details": json.loads(details) if details else None,
+            "articles": json.loads(articles) if articles else None,
+            "newsletter": json.loads(newsletter) if newsletter else None,
+        }
+
+    def reached(self, entry, stage):
+        """
+        True if a journal entry has completed `stage` (or a later one).
+        """
+        return entry is not None and STAGES.index(entry["stage"]) >= STAGES.index(stage)
+
+    def record_fetched(self, msg_id, details):
+        self._write(msg_id, FETCHED, details=json.dumps(details))
+
+    def record_extracted(self, msg_id, articles):
+        self._write(msg_id, EXTRACTED, articles=json.dumps(articles))
+
+    def record_published(self, msg_id, newsletter):
+        self._write(msg_id, PUBLISHED, newsletter=json.dumps(newsletter))
+
+    def record_labelled(self, msg_ids):
+        self._advance(msg_ids, LABELLED)
+
+    def record_summarized(self, msg_ids):
+        self._advance(msg_ids, SUMMARIZED)
+
+    def pending_summary(self, exclude_ids=()):
+        """
+        Newsletters that were published and labelled by an earlier run but never
+        made it into a daily summary (e.g. the run died before the summary was written).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT msg_id, newsletter FROM messages WHERE stage = ? ORDER BY updated_at", (LABELLED,)
+            ).fetchall()
+        return [json.loads(newsletter) for msg_id, newsletter in rows if msg_id not in exclude_ids and newsletter]
+
+    def prune(self):
+        """
+        Drops entries untouched for longer than the retention window, whatever their stage:
+        messages stuck before labelling (no articles, repeated failures) have left the
+        2-day search window by then, and labelled ones have missed their summary.
+        """
+        cutoff = time.time() - self.retention_days * 86400
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE updated_at < ?", (cutoff,))
+            self._conn.commit()
+
+    def _write(self, msg_id, stage, **columns):
+        # Later stages keep the payloads recorded by earlier ones
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO messages (msg_id, stage, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(msg_id) DO UPDATE SET stage = excluded.stage, updated_at = excluded.updated_at",
+                (msg_id, stage, time.time())
+            )
+            for column, value in columns.items():
+                self._conn.execute(f"UPDATE messages SET {column} = ? WHERE msg_id = ?", (value, msg_id))
+            self._conn.commit()
+
+    def _advance(self, msg_ids, stage):
+        # Never moves an entry back (e.g. labelling a message that was already summarized)
+        earlier = STAGES[:STAGES.index(stage)]
+        placeholders = ", ".join("?" * len(earlier))
+        with self._lock:
+            self._conn.executemany(
+                f"UPDATE messages SET stage = ?, updated_at = ? WHERE msg_id = ? AND stage IN ({placeholders})",
+                [(stage, time.time(), msg_id, *earlier) for msg_id in msg_ids]
+            )
+            self._conn.commit()
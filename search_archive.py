@@ -0,0 +1,53 @@
+import time
+import argparse
+from article_archive import ArticleArchive
+
+def search(args):
+    archive = ArticleArchive()
+    start = time.perf_counter()
+    results = archive.search(" ".join(args.query) or None, category=args.category, newsletter=args.newsletter,
+                             since=args.since, until=args.until, limit=args.limit)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    for article in results:
+        icon = "💥 " if article["must_read"] else ""
+        print(f"{article['date'] or '':<10}  [{article['category'] or 'Uncategorized'}] {icon}{article['title']}")
+        print(f"            {article['newsletter'] or ''} — {article['url'] or ''}")
+        print(f"            {article['snippet'] or article['summary'][:160]}")
+        if args.takeaways:
+            for takeaway in article["takeaways"]:
+                print(f"              - {takeaway}")
+    print(f"{len(results)} articles ({elapsed_ms:.1f} ms)")
+
+def import_notion(args):
+    # Imported here so searching doesn't need Notion credentials
+    from notion_agent import NotionAgent
+
+    archive = ArticleArchive()
+    if args.rebuild:
+        archive.clear()
+    archive.import_from_notion(NotionAgent())
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the local article archive.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search_parser = commands.add_parser("search", help="full-text search with optional filters")
+    search_parser.add_argument("query", nargs="*", help='FTS5 query, e.g. llm agents, "vector database", quantum*; plain text like gpt-5 or C++ works too')
+    search_parser.add_argument("--category")
+    search_parser.add_argument("--newsletter", help="substring of the newsletter name")
+    search_parser.add_argument("--since", help="YYYY-MM-DD (inclusive)")
+    search_parser.add_argument("--until", help="YYYY-MM-DD (inclusive)")
+    search_parser.add_argument("--limit", type=int, default=20)
+    search_parser.add_argument("--takeaways", action="store_true", help="print key takeaways too")
+    search_parser.set_defaults(func=search)
+
+    import_parser = commands.add_parser("import", help="backfill the archive from the Notion Articles DB")
+    import_parser.add_argument("--rebuild", action="store_true", help="clear the archive first")
+    import_parser.set_defaults(func=import_notion)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import os
+import json
+from article_dedup import unique_articles
+
+# Maximum children per pages.create / blocks.children.append request
+BLOCKS_PER_REQUEST = 100
+# Notion also caps a request at 1000 blocks including nested children, and 500KB of payload
+MAX_BLOCKS_PER_REQUEST = 1000
+MAX_PAYLOAD_BYTES = 500_000
+# Headroom for the request envelope (page properties, parent) around the children
+PAYLOAD_MARGIN_BYTES = 10_000
+# Merged duplicates listed per compact-layout paragraph
+DUPLICATES_PER_BLOCK = 30
+
+# full: one block per line (title, summary, takeaways label, one per takeaway, spacer), per newsletter
+# compact: one toggle per article with summary and takeaways folded into a single nested paragraph
+# category: compact toggles grouped under one heading per category instead of per newsletter
+LAYOUTS = ("full", "compact", "category")
+# Layouts that render one newsletter at a time (streaming summaries)
+STREAMING_LAYOUTS = ("full", "compact")
+
+def summary_blocks(newsletters, layout):
+    """
+    Yields the summary page blocks for processed newsletters in the given layout.
+    """
+    if layout == "category":
+        yield from category_blocks(newsletters)
+        return
+    render = compact_newsletter_blocks if layout == "compact" else newsletter_blocks
+    for newsletter in newsletters:
+        yield from render(newsletter)
+
+def sized_blocks(blocks):
+    """
+    Yields (block, nested block count, payload bytes, starts a new request) for
+    each top-level block, splitting requests at Notion's per-request limits on
+    top-level children, total blocks and payload size.
+    """
+    top_level = 0
+    count = 0
+    size = 0
+    for block in blocks:
+        block_count = count_blocks(block)
+        block_size = len(json.dumps(block, ensure_ascii=False).encode("utf-8"))
+        new_request = top_level > 0 and (
+            top_level == BLOCKS_PER_REQUEST or count + block_count > MAX_BLOCKS_PER_REQUEST
+            or size + block_size > MAX_PAYLOAD_BYTES - PAYLOAD_MARGIN_BYTES)
+        if new_request:
+            top_level, count, size = 0, 0, 0
+        top_level += 1
+        count += block_count
+        size += block_size
+        yield block, block_count, block_size, new_request
+
+def chunk_blocks(blocks):
+    """
+    Groups top-level blocks into request-sized lists (see sized_blocks).
+    """
+    chunk = []
+    for block, _, _, new_request in sized_blocks(blocks):
+        if new_request:
+            yield chunk
+            chunk = []
+        chunk.append(block)
+    if chunk:
+        yield chunk
+
+def count_blocks(block):
+    """
+    The block plus all of its nested children.
+    """
+    children = block.get(block["type"], {}).get("children", [])
+    return 1 + sum(count_blocks(child) for child in children)
+
+def estimate(newsletters, layout):
+    """
+    Blocks, payload bytes and API requests a summary would take in `layout`.
+    Blocks are counted as they are generated, so no layout's block list is kept in memory.
+    """
+    # pages.create carries the first chunk; an empty summary still costs one call
+    cost = {"layout": layout, "top_level_blocks": 0, "blocks": 0, "bytes": 0, "requests": 1}
+    for _, block_count, block_size, new_request in sized_blocks(summary_blocks(newsletters, layout)):
+        cost["top_level_blocks"] += 1
+        cost["blocks"] += block_count
+        cost["bytes"] += block_size
+        cost["requests"] += new_request
+    return cost
+
+def choose_layout(newsletters, layouts=LAYOUTS):
+    """
+    Returns (layout, estimate) for NOTION_SUMMARY_LAYOUT: full (the default),
+    compact, category or auto. auto picks the layout needing the fewest requests,
+    preferring the earlier (more detailed) layout on a tie, so days that fit
+    in one request keep the full layout. A layout not in `layouts` falls back to full.
+    """
+    setting = os.environ.get("NOTION_SUMMARY_LAYOUT", "full").lower()
+    if setting == "auto":
+        estimates = [estimate(newsletters, layout) for layout in layouts]
+        best = min(estimates, key=lambda e: e["requests"])
+        return best["layout"], best
+    if setting not in layouts:
+        if setting not in LAYOUTS:
+            print(f"Unknown NOTION_SUMMARY_LAYOUT '{setting}'; using full.")
+        setting = "full"
+    return setting, estimate(newsletters, setting)
+
+def title_runs(article):
+    """
+    Rich text for an article's title line: 💥 [Title](url) [View in DB]
+    """
+    icon = "💥 " if article.get('must_read', False) else ""
+
+    # Ensure URL is valid string
+    article_url = article.get('url')
+    if not article_url:
+        article_url = "https://example.com" # Fallback
+
+    text_content = [
+        {"type": "text", "text": {"content": icon}},
+        {"type": "text", "text": {"content": article['title'], "link": {"url": article_url}}},
+        {"type": "text", "text": {"content": " "}},
+    ]
+
+    # Add link to Notion DB entry if we have the ID
+    if article.get('notion_id'):
+        # Notion app link format or just a text indicator?
+        # The prompt asks for "link to Articles DB entry".
+        # We can't easily get the public URL of the new page immediately without an extra call,
+        # but we can try to mention it or just link to the DB.
+        # For now, let's just add a text marker.
+        text_content.append({
+            "type": "text",
+            "text": {"content": "[View in DB]", "link": {"url": f"https://notion.so/{article['notion_id'].replace('-', '')}"}}
+        })
+    return text_content
+
+def duplicate_runs(article):
+    """
+    Rich text pointing a merged duplicate at the copy it was merged into.
+    """
+    primary = article['duplicate_of']
+    return [
+        {"type": "text", "text": {"content": f"Also covered by {primary['newsletter_name']}: "}},
+        {"type": "text", "text": {"content": primary['title'], "link": {"url": primary['url'] or "https://example.com"}}},
+    ]
+
+def newsletter_blocks(newsletter):
+    """
+    Yields the full-layout summary blocks for one newsletter: header, articles, divider.
+    """
+    # Newsletter Section Header
+    header_text = f"{newsletter['name']} - {newsletter['subject']}"
+    yield {
+        "object": "block",
+        "type": "heading_2",
+        "heading_2": {"rich_text": [{"text": {"content": header_text}}]}
+    }
+
+    for article in newsletter['articles']:
+        if article.get('duplicate_of'):
+            # Covered in full under the newsletter it was first seen in
+            yield {
+                "object": "block",
+                "type": "paragraph",
+                "paragraph": {"rich_text": duplicate_runs(article)}
+            }
+            continue
+
+        # Article Title Line: 💥 [Title](url) [link to DB]
+        yield {
+            "object": "block",
+            "type": "paragraph",
+            "paragraph": {"rich_text": title_runs(article)}
+        }
+
+        other_sources = [name for name in article.get('sources', []) if name != newsletter['name']]
+        if other_sources:
+            yield {
+                "object": "block",
+                "type": "paragraph",
+                "paragraph": {"rich_text": [{"text": {"content": f"Also in: {', '.join(other_sources)}"}, "annotations": {"italic": True}}]}
+            }
+
+        # Summary
+        yield {
+            "object": "block",
+            "type": "paragraph",
+            "paragraph": {"rich_text": [{"text": {"content": article['summary']}}]}
+        }
+
+        # Key Takeaways
+        yield {
+            "object": "block",
+            "type": "paragraph",
+            "paragraph": {"rich_text": [{"text": {"content": "Key Takeaways:"}, "annotations": {"bold": True}}]}
+        }
+
+        for takeaway in article['takeaways']:
+            yield {
+                "object": "block",
+                "type": "bulleted_list_item",
+                "bulleted_list_item": {"rich_text": [{"text": {"content": takeaway}}]}
+            }
+
+        # Spacer
+        yield {"object": "block", "type": "paragraph", "paragraph": {"rich_text": []}}
+
+    # Divider between newsletters
+    yield {"object": "block", "type": "divider", "divider": {}}
+
+def article_toggle(article, note=None):
+    """
+    One collapsed block per article: the title line (plus an italic note), with
+    summary and takeaways as runs of a single nested paragraph.
+    """
+    runs = title_runs(article)
+    if note:
+        runs.append({"text": {"content": f" ({note})"}, "annotations": {"italic": True}})
+
+    body = []
+    if article.get('summary'):
+        body.append({"text": {"content": article['summary']}})
+    if article.get('takeaways'):
+        body.append({"text": {"content": "\n\nKey Takeaways:"}, "annotations": {"bold": True}})
+        body.extend({"text": {"content": f"\n• {takeaway}"}} for takeaway in article['takeaways'])
+
+    toggle = {"rich_text": runs}
+    if body:
+        toggle["children"] = [{"object": "block", "type": "paragraph", "paragraph": {"rich_text": body}}]
+    return {"object": "block", "type": "toggle", "toggle": toggle}
+
+def compact_newsletter_blocks(newsletter):
+    """
+    Yields the compact-layout blocks for one newsletter: header, one toggle per
+    article, and a single paragraph listing any merged duplicates.
+    """
+    yield {
+        "object": "block",
+        "type": "heading_2",
+        "heading_2": {"rich_text": [{"text": {"content": f"{newsletter['name']} - {newsletter['subject']}"}}]}
+    }
+    for article in unique_articles(newsletter):
+        other_sources = [name for name in article.get('sources', []) if name != newsletter['name']]
+        yield article_toggle(article, f"also in {', '.join(other_sources)}" if other_sources else None)
+
+    duplicates = [article for article in newsletter['articles'] if article.get('duplicate_of')]
+    # A rich_text array holds at most 100 runs (three per duplicate)
+    for start in range(0, len(duplicates), DUPLICATES_PER_BLOCK):
+        runs = []
+        for i, article in enumerate(duplicates[start:start + DUPLICATES_PER_BLOCK]):
+            if i:
+                runs.append({"type": "text", "text": {"content": "\n"}})
+            runs.extend(duplicate_runs(article))
+        yield {"object": "block", "type": "paragraph", "paragraph": {"rich_text": runs}}
+
+def category_blocks(newsletters):
+    """
+    Yields the category-layout blocks: one heading per category (in order of
+    first appearance), then a toggle per article naming its newsletters.
+    Merged duplicates appear only through their primary's source list.
+    """
+    by_category = {}
+    for newsletter in newsletters:
+        for article in unique_articles(newsletter):
+            category = article.get('category') or "Uncategorized"
+            by_category.setdefault(category, []).append((newsletter, article))
+
+    for category, entries in by_category.items():
+        yield {
+            "object": "block",
+            "type": "heading_2",
+            "heading_2": {"rich_text": [{"text": {"content": f"{category} ({len(entries)})"}}]}
+        }
+        for newsletter, article in entries:
+            yield article_toggle(article, ", ".join(article.get('sources') or [newsletter['name']]))
@@ -0,0 +1,11 @@
+from article_archive import ArticleArchive
+
+def test_search_accepts_plain_text_that_is_not_fts_syntax(tmp_path):
+    archive = ArticleArchive(path=str(tmp_path / "archive.sqlite3"))
+    archive.add_newsletter({"name": "AI Weekly", "subject": "Issue 1", "articles": [{
+        "title": "GPT-5 launch", "url": "https://example.org/gpt-5",
+        "summary": "What's new for C++ developers.", "takeaways": [], "category": "AI",
+    }]})
+    for query in ["gpt-5", "C++", "what's new", "gpt*", "launch OR rumours"]:
+        assert [article["title"] for article in archive.search(query)] == ["GPT-5 launch"], query
+    assert archive.search("quantum") == []
@@ -0,0 +1,14 @@
+from article_schema import validate_articles
+
+def test_articles_without_a_usable_url_are_kept_unlinked():
+    articles = validate_articles([
+        {"title": "No link", "summary": "..."},
+        {"title": "Bad link", "summary": "...", "url": "see the website"},
+        {"title": "Good link", "summary": "...", "url": " https://example.org/story "},
+    ])
+    assert [article["title"] for article in articles] == ["No link", "Bad link", "Good link"]
+    assert [article["url"] for article in articles] == [None, None, "https://example.org/story"]
+
+def test_articles_without_title_or_summary_are_dropped():
+    articles = validate_articles([{"title": "", "summary": "..."}, {"title": "No summary"}])
+    assert articles == []
@@ -0,0 +1,50 @@
+from content_preprocessor import clean_body
+
+ARTICLE_LINES = [f"Story {i}: something happened https://example.com/{i}" for i in range(20)]
+
+def test_article_lines_mentioning_footer_words_are_kept():
+    body = "\n".join(
+        ARTICLE_LINES[:5]
+        + ["Regulators fined the company over its privacy policy changes.",
+           "Copyright lawsuits against AI labs are piling up.",
+           "Readers can now unsubscribe from individual topics, the team said."]
+        + ARTICLE_LINES[5:]
+        + ["", "Forward this to a friend", "© 2025 Example Media. All rights reserved."]
+    )
+    cleaned = clean_body(body)
+    assert "privacy policy changes" in cleaned
+    assert "Copyright lawsuits" in cleaned
+    assert "unsubscribe from individual topics" in cleaned
+    assert "Forward this to a friend" not in cleaned
+    assert "All rights reserved" not in cleaned
+
+def test_footer_is_cut_at_marker():
+    body = "\n".join(ARTICLE_LINES + ["You are receiving this because you subscribed.", "Some Street 1, City"])
+    cleaned = clean_body(body)
+    assert "Story 19" in cleaned
+    assert "receiving this" not in cleaned
+    assert "Some Street" not in cleaned
+
+def test_footer_words_in_the_last_quarter_do_not_cut_articles():
+    body = "\n".join(
+        ARTICLE_LINES[:13]
+        + ["Readers can now unsubscribe from individual topics, the team said."]
+        + ARTICLE_LINES[13:16]
+        + ["", "Unsubscribe | Manage preferences", "Some Street 1, City"]
+    )
+    cleaned = clean_body(body)
+    assert "unsubscribe from individual topics" in cleaned
+    for i in range(13, 16):
+        assert f"Story {i}:" in cleaned
+    assert "Manage preferences" not in cleaned
+    assert "Some Street" not in cleaned
+
+def test_links_keep_fragments_and_lose_only_tracking_parameters():
+    cleaned = clean_body(
+        "App: https://example.com/#/article/5?x=1\n"
+        "Docs: https://docs.python.org/3/library/re.html#re.sub\n"
+        "Story: https://news.example.org/story?id=7&utm_source=newsletter#comments"
+    )
+    assert "https://example.com/#/article/5?x=1" in cleaned
+    assert "https://docs.python.org/3/library/re.html#re.sub" in cleaned
+    assert "https://news.example.org/story?id=7#comments" in cleaned
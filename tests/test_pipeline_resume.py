@@ -0,0 +1,95 @@
+import pytest
+
+from pipeline import NewsletterPipeline
+from run_journal import RunJournal, LABELLED, SUMMARIZED
+
+DETAILS = {"id": "m1", "subject": "Issue 1", "sender": "AI Weekly <news@example.org>",
+           "date": "", "list_id": "", "body": "Story one https://example.org/1"}
+ARTICLE = {"title": "Story one", "url": "https://example.org/1", "summary": "...", "takeaways": [],
+           "category": "AI", "must_read": True, "rank": 1,
+           "newsletter_name": "AI Weekly", "newsletter_subject": "Issue 1"}
+
+class FakeGmail:
+    def __init__(self):
+        self.fetched = []
+        self.labelled = []
+
+    def get_email_details_batch(self, msg_ids):
+        self.fetched.extend(msg_ids)
+        return [dict(DETAILS, id=msg_id) for msg_id in msg_ids]
+
+    def add_label_batch(self, msg_ids, label_name):
+        self.labelled.extend(msg_ids)
+
+class FakeLLM:
+    batch_mode = False
+
+    def __init__(self):
+        self.calls = 0
+
+    def process_newsletter(self, subject, body, newsletter_name):
+        self.calls += 1
+        return [dict(ARTICLE)]
+
+class FakeNotion:
+    def __init__(self):
+        self.created = []
+
+    def create_article_entries(self, articles):
+        self.created.extend(article["title"] for article in articles)
+        return [f"page-{len(self.created)}" for _ in articles]
+
+    def update_article_sources(self, article):
+        return True
+
+@pytest.fixture
+def services(tmp_path, monkeypatch):
+    monkeypatch.setenv("ARCHIVE_ENABLED", "false")
+    monkeypatch.setenv("TRIAGE_ENABLED", "false")
+    journal = RunJournal(path=str(tmp_path / "journal.sqlite3"))
+    gmail, llm, notion = FakeGmail(), FakeLLM(), FakeNotion()
+    pipeline = NewsletterPipeline(gmail, llm, notion, journal=journal)
+    yield pipeline, journal, gmail, llm, notion
+    pipeline.close()
+
+def test_fresh_message_goes_through_every_stage(services):
+    pipeline, journal, gmail, llm, notion = services
+    newsletters = pipeline.run([{"id": "m1"}])
+    assert [n["id"] for n in newsletters] == ["m1"]
+    assert (gmail.fetched, llm.calls, notion.created, gmail.labelled) == (["m1"], 1, ["Story one"], ["m1"])
+    assert journal.get("m1")["stage"] == LABELLED
+
+def test_resume_from_extracted_skips_fetch_and_llm(services):
+    pipeline, journal, gmail, llm, notion = services
+    journal.record_fetched("m1", DETAILS)
+    journal.record_extracted("m1", [dict(ARTICLE)])
+
+    newsletters = pipeline.run([{"id": "m1"}])
+    assert [n["id"] for n in newsletters] == ["m1"]
+    assert (gmail.fetched, llm.calls, notion.created, gmail.labelled) == ([], 0, ["Story one"], ["m1"])
+
+def test_resume_from_published_skips_llm_and_notion(services):
+    pipeline, journal, gmail, llm, notion = services
+    journal.record_fetched("m1", DETAILS)
+    journal.record_extracted("m1", [dict(ARTICLE)])
+    journal.record_published("m1", {"id": "m1", "name": "AI Weekly", "subject": "Issue 1", "date": None,
+                                    "articles": [dict(ARTICLE, notion_id="page-1")]})
+
+    newsletters = pipeline.run([{"id": "m1"}])
+    assert newsletters[0]["articles"][0]["notion_id"] == "page-1"
+    assert (gmail.fetched, llm.calls, notion.created, gmail.labelled) == ([], 0, [], ["m1"])
+    assert journal.get("m1")["stage"] == LABELLED
+
+def test_summarized_message_is_only_labelled(services):
+    pipeline, journal, gmail, llm, notion = services
+    journal.record_fetched("m1", DETAILS)
+    journal.record_extracted("m1", [dict(ARTICLE)])
+    journal.record_published("m1", {"id": "m1", "name": "AI Weekly", "subject": "Issue 1", "date": None,
+                                    "articles": [dict(ARTICLE, notion_id="page-1")]})
+    journal.record_summarized(["m1"])
+
+    assert pipeline.run([{"id": "m1"}]) == []
+    assert (llm.calls, notion.created, gmail.labelled) == (0, [], ["m1"])
+    # Labelling afterwards doesn't put it back in line for a summary
+    assert journal.get("m1")["stage"] == SUMMARIZED
+    assert journal.pending_summary() == []
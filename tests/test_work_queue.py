@@ -0,0 +1,57 @@
+import time
+
+from work_queue import WorkQueue, DONE, LEASED, PENDING
+
+def make_queue(tmp_path, lease_seconds=600):
+    return WorkQueue(path=str(tmp_path / "queue.sqlite3"), lease_seconds=lease_seconds, max_attempts=3)
+
+def job(queue, msg_id):
+    return queue._conn.execute(
+        "SELECT status, lease_owner, attempts FROM jobs WHERE msg_id = ?", (msg_id,)
+    ).fetchone()
+
+def test_live_leases_are_not_handed_out_twice(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue("alice", ["m1", "m2"])
+    assert queue.lease("w1", {"alice": 10}, 10) == [("alice", "m1"), ("alice", "m2")]
+    assert queue.lease("w2", {"alice": 10}, 10) == []
+
+def test_expired_lease_is_leased_again(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.05)
+    queue.enqueue("alice", ["m1"])
+    assert queue.lease("w1", {"alice": 10}, 10) == [("alice", "m1")]
+    time.sleep(0.1)
+    assert queue.lease("w2", {"alice": 10}, 10) == [("alice", "m1")]
+    assert job(queue, "m1") == (LEASED, "w2", 2)
+
+def test_stale_worker_cannot_claim_or_complete(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.05)
+    queue.enqueue("alice", ["m1"])
+    queue.lease("w1", {"alice": 10}, 10)
+    time.sleep(0.1)
+    queue.lease("w2", {"alice": 10}, 10)
+
+    assert queue.claim("w1", "alice", ["m1"]) == []
+    queue.complete("w1", "alice", ["m1"], {"m1": {"id": "m1"}})
+    queue.release("w1", "alice", ["m1"], "lost")
+    assert job(queue, "m1") == (LEASED, "w2", 2)
+
+    assert queue.claim("w2", "alice", ["m1"]) == ["m1"]
+    queue.complete("w2", "alice", ["m1"], {"m1": {"id": "m1"}})
+    assert job(queue, "m1")[0] == DONE
+    assert queue.pending_summary() == [("alice", {"id": "m1"})]
+
+def test_released_jobs_return_to_the_pool_until_max_attempts(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue("alice", ["m1"])
+    for attempt in range(3):
+        assert queue.lease("w1", {"alice": 10}, 10) == [("alice", "m1")]
+        queue.release("w1", "alice", ["m1"], "not labelled")
+        assert job(queue, "m1")[0] == (PENDING if attempt < 2 else "failed")
+    assert queue.lease("w1", {"alice": 10}, 10) == []
+
+def test_lease_respects_mailbox_quota(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue("alice", ["m1", "m2", "m3"])
+    assert len(queue.lease("w1", {"alice": 2}, 10)) == 2
+    assert queue.lease("w2", {"alice": 2}, 10) == []
@@ -0,0 +1,162 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from email.utils import parseaddr
+
+def sender_key(details):
+    """
+    Identifies the newsletter a message belongs to: its List-Id when present,
+    otherwise the sender's email address.
+    """
+    list_id = (details.get("list_id") or "").strip().lower()
+    if list_id:
+        # "Name <id.list.example.com>" -> "id.list.example.com"
+        match = re.search(r"<([^>]+)>", list_id)
+        return "list:" + (match.group(1) if match else list_id)
+    return "from:" + parseaddr(details.get("sender") or "")[1].lower()
+
+class TriageRules:
+    """
+    Decides from headers and size alone (format='metadata') whether a message
+    is worth downloading in full.
+
+    Rules come from a JSON file (TRIAGE_RULES_FILE, default triage_rules.json):
+        {
+            "skip_senders": ["promotions@example.com", "digest.list.example.com"],
+            "skip_subjects": ["(?i)webinar", "(?i)sponsored"],
+            "min_size_bytes": 2000,
+            "max_size_bytes": 5000000
+        }
+    skip_senders are case-insensitive substrings of the From header or List-Id;
+    skip_subjects are regular expressions.
+
+    Senders whose last TRIAGE_EMPTY_THRESHOLD newsletters all yielded no articles
+    are skipped too ("known-empty"), except every TRIAGE_PROBE_EVERY-th message,
+    which is still fetched in case the sender starts sending content again.
+    """
+    def __init__(self, rules_file=None, history=None):
+        self.rules_file = rules_file or os.environ.get("TRIAGE_RULES_FILE", "triage_rules.json")
+        rules = {}
+        if os.path.exists(self.rules_file):
+            with open(self.rules_file) as f:
+                rules = json.load(f)
+        self.skip_senders = [s.lower() for s in rules.get("skip_senders", [])]
+        self.skip_subjects = [re.compile(pattern) for pattern in rules.get("skip_subjects", [])]
+        self.min_size = rules.get("min_size_bytes")
+        self.max_size = rules.get("max_size_bytes")
+
+        self.history = history or SenderHistory()
+        self.empty_threshold = int(os.environ.get("TRIAGE_EMPTY_THRESHOLD", 3))
+        self.probe_every = int(os.environ.get("TRIAGE_PROBE_EVERY", 5))
+
+    @property
+    def active(self):
+        """
+        False when there is nothing to triage on, so the metadata round trip can be skipped.
+        """
+        return bool(self.skip_senders or self.skip_subjects or self.min_size or self.max_size
+                    or self.history.has_empty_senders(self.empty_threshold))
+
+    def check(self, metadata):
+        """
+        Returns the reason to skip a message (from get_email_metadata_batch), or None to fetch it.
+        """
+        sender = metadata["sender"].lower()
+        list_id = metadata.get("list_id", "").lower()
+        for pattern in self.skip_senders:
+            if pattern in sender or (list_id and pattern in list_id):
+                return f"sender matches '{pattern}'"
+        for pattern in self.skip_subjects:
+            if pattern.search(metadata["subject"]):
+                return f"subject matches '{pattern.pattern}'"
+        size = metadata.get("size") or 0
+        if self.min_size and size < self.min_size:
+            return f"{size} bytes is below min_size_bytes"
+        if self.max_size and size > self.max_size:
+            return f"{size} bytes is above max_size_bytes"
+
+        key = sender_key(metadata)
+        if self.history.is_known_empty(key, self.empty_threshold):
+            if self.history.record_skip(key) % self.probe_every == 0:
+                return None
+            return "sender's recent newsletters had no articles"
+        return None
+
+    def record_outcome(self, details, article_count):
+        """
+        Updates the sender's history once a newsletter has been extracted.
+        """
+        self.history.record(sender_key(details), details["id"], article_count)
+
+class SenderHistory:
+    """
+    Per-sender extraction outcomes in SQLite: consecutive newsletters without
+    articles, and messages skipped since the last full fetch.
+    Each message counts once, even if it is extracted again on a later run.
+    """
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("TRIAGE_HISTORY_PATH", "sender_history.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS senders ("
+            " sender TEXT PRIMARY KEY,"
+            " empty_streak INTEGER NOT NULL DEFAULT 0,"
+            " processed INTEGER NOT NULL DEFAULT 0,"
+            " skipped INTEGER NOT NULL DEFAULT 0,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outcomes ("
+            " msg_id TEXT PRIMARY KEY,"
+            " sender TEXT NOT NULL,"
+            " article_count INTEGER NOT NULL,"
+            " recorded_at REAL NOT NULL)"
+        )
+        # Outcomes only guard against double counting; the streaks live in senders
+        self._conn.execute("DELETE FROM outcomes WHERE recorded_at < ?", (time.time() - 30 * 86400,))
+        self._conn.commit()
+
+    def record(self, sender, msg_id, article_count):
+        with self._lock:
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO outcomes (msg_id, sender, article_count, recorded_at) VALUES (?, ?, ?, ?)",
+                (msg_id, sender, article_count, time.time())
+            ).rowcount
+            if not inserted:
+                # Close the implicit transaction so other processes aren't locked out
+                self._conn.commit()
+                return
+            self._conn.execute(
+                "INSERT INTO senders (sender, empty_streak, processed, skipped, updated_at) VALUES (?, ?, 1, 0, ?) "
+                "ON CONFLICT(sender) DO UPDATE SET"
+                " empty_streak = CASE WHEN ? > 0 THEN 0 ELSE empty_streak + 1 END,"
+                " processed = processed + 1, skipped = 0, updated_at = excluded.updated_at",
+                (sender, 0 if article_count else 1, time.time(), article_count)
+            )
+            self._conn.commit()
+
+    def record_skip(self, sender):
+        """
+        Counts a skipped message; returns the number skipped since the last full fetch.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE senders SET skipped = skipped + 1, updated_at = ? WHERE sender = ?", (time.time(), sender)
+            )
+            self._conn.commit()
+            row = self._conn.execute("SELECT skipped FROM senders WHERE sender = ?", (sender,)).fetchone()
+        return row[0] if row else 0
+
+    def is_known_empty(self, sender, threshold):
+        with self._lock:
+            row = self._conn.execute("SELECT empty_streak FROM senders WHERE sender = ?", (sender,)).fetchone()
+        return row is not None and row[0] >= threshold
+
+    def has_empty_senders(self, threshold):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM senders WHERE empty_streak >= ? LIMIT 1", (threshold,)).fetchone()
+        return row is not None
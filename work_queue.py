@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+def load_mailboxes(path=None):
+    """
+    Reads the mailbox list (MAILBOXES_FILE, default mailboxes.json):
+        [
+            {"name": "alice", "token_file": "tokens/alice.json", "max_in_flight": 10},
+            {"name": "bob", "token_file": "tokens/bob.json"}
+        ]
+    Each mailbox gets its own incremental sync state and run journal file.
+    max_in_flight caps how many of its messages are leased at once across all workers.
+    """
+    path = path or os.environ.get("MAILBOXES_FILE", "mailboxes.json")
+    with open(path) as f:
+        mailboxes = json.load(f)
+    default_in_flight = int(os.environ.get("QUEUE_MAX_IN_FLIGHT", 20))
+    for mailbox in mailboxes:
+        name = mailbox["name"]
+        mailbox.setdefault("token_file", f"token.{name}.json")
+        mailbox.setdefault("sync_state_file", f"sync_state.{name}.json")
+        mailbox.setdefault("journal_path", f"run_journal.{name}.sqlite3")
+        mailbox.setdefault("max_in_flight", default_in_flight)
+    return mailboxes
+
+class WorkQueue:
+    """
+    Durable SQLite queue of (mailbox, message id) jobs shared by any number of
+    worker processes on one host (SQLite locking isn't reliable over network
+    filesystems, so the queue file must be on a local disk). A worker leases
+    a batch of jobs for a limited time and renews the lease while it works;
+    jobs whose lease expires (crashed worker) go back to the pool. Only the current lease holder may label or complete
+    a job, so each message is labelled and completed by exactly one worker.
+    """
+    def __init__(self, path=None, lease_seconds=None, max_attempts=None):
+        self.path = path or os.environ.get("QUEUE_PATH", "work_queue.sqlite3")
+        self.lease_seconds = lease_seconds or float(os.environ.get("QUEUE_LEASE_SECONDS", 600))
+        self.max_attempts = max_attempts or int(os.environ.get("QUEUE_MAX_ATTEMPTS", 3))
+        self._lock = threading.Lock()
+        # Autocommit mode; writes use explicit BEGIN IMMEDIATE transactions
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        # Rollback journal rather than WAL: WAL's shared-memory index only works for processes
+        # on the same machine, and nothing here needs concurrent readers during a write
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " mailbox TEXT NOT NULL,"
+            " msg_id TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " lease_owner TEXT,"
+            " lease_expires REAL,"
+            " result TEXT,"
+            " error TEXT,"
+            " summarized INTEGER NOT NULL DEFAULT 0,"
+            " enqueued_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (mailbox, msg_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, mailbox, enqueued_at)")
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent leases never hand out the same row
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, mailbox, msg_ids):
+        """
+        Adds jobs for messages not already queued. Returns how many were new.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (mailbox, msg_id, status, enqueued_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(mailbox, msg_id, PENDING, now, now) for msg_id in msg_ids]
+            )
+            return conn.total_changes - before
+
+    def lease(self, worker_id, quotas, limit):
+        """
+        Leases up to `limit` pending (or expired) jobs for worker_id, oldest first,
+        without exceeding any mailbox's in-flight quota. quotas: {mailbox: max_in_flight}.
+        Returns a list of (mailbox, msg_id).
+        """
+        now = time.time()
+        leased = []
+        with self._transaction() as conn:
+            # Jobs whose workers died too often are given up on
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = 'lease expired', lease_owner = NULL, updated_at = ?"
+                " WHERE status = ? AND lease_expires <= ? AND attempts >= ?",
+                (FAILED, now, LEASED, now, self.max_attempts)
+            )
+            in_flight = dict(conn.execute(
+                "SELECT mailbox, COUNT(*) FROM jobs WHERE status = ? AND lease_expires > ? GROUP BY mailbox",
+                (LEASED, now)
+            ).fetchall())
+
+            # Shuffled so workers spread across mailboxes instead of all draining the first one
+            mailboxes = list(quotas)
+            random.shuffle(mailboxes)
+            for mailbox in mailboxes:
+                allowance = min(quotas[mailbox] - in_flight.get(mailbox, 0), limit - len(leased))
+                if allowance <= 0:
+                    continue
+                rows = conn.execute(
+                    "SELECT msg_id FROM jobs WHERE mailbox = ?"
+                    " AND (status = ? OR (status = ? AND lease_expires <= ?))"
+                    " ORDER BY enqueued_at LIMIT ?",
+                    (mailbox, PENDING, LEASED, now, allowance)
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1,"
+                    " updated_at = ? WHERE mailbox = ? AND msg_id = ?",
+                    [(LEASED, worker_id, now + self.lease_seconds, now, mailbox, msg_id) for msg_id, in rows]
+                )
+                leased.extend((mailbox, msg_id) for msg_id, in rows)
+        return leased
+
+    def renew(self, worker_id):
+        """
+        Extends every lease worker_id still holds. Expired leases can't be renewed.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE status = ? AND lease_owner = ? AND lease_expires > ?",
+                (now + self.lease_seconds, LEASED, worker_id, now)
+            )
+
+    def claim(self, worker_id, mailbox, msg_ids):
+        """
+        Returns the subset of msg_ids whose lease worker_id still holds, extending
+        those leases; called right before labelling so a worker whose lease was
+        taken over never labels a message another worker now owns.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            owned = [msg_id for msg_id in msg_ids if conn.execute(
+                "SELECT 1 FROM jobs WHERE mailbox = ? AND msg_id = ? AND status = ? AND lease_owner = ? AND lease_expires > ?",
+                (mailbox, msg_id, LEASED, worker_id, now)
+            ).fetchone()]
+            conn.executemany(
+                "UPDATE jobs SET lease_expires = ? WHERE mailbox = ? AND msg_id = ?",
+                [(now + self.lease_seconds, mailbox, msg_id) for msg_id in owned]
+            )
+        return owned
+
+    def complete(self, worker_id, mailbox, msg_ids, results=None):
+        """
+        Marks labelled jobs done, storing each processed newsletter for the daily summary.
+        results: {msg_id: newsletter dict}; messages skipped by triage have none.
+        """
+        results = results or {}
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE jobs SET status = ?, result = ?, lease_owner = NULL, lease_expires = NULL, error = NULL,"
+                " updated_at = ? WHERE mailbox = ? AND msg_id = ? AND status = ? AND lease_owner = ?",
+                [(DONE, json.dumps(results[msg_id]) if msg_id in results else None, now, mailbox, msg_id, LEASED, worker_id)
+                 for msg_id in msg_ids]
+            )
+
+    def release(self, worker_id, mailbox, msg_ids, error):
+        """
+        Returns unfinished jobs to the pool, or marks them failed after max_attempts.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, error = ?,"
+                " lease_owner = NULL, lease_expires = NULL, updated_at = ?"
+                " WHERE mailbox = ? AND msg_id = ? AND status = ? AND lease_owner = ?",
+                [(self.max_attempts, FAILED, PENDING, error, now, mailbox, msg_id, LEASED, worker_id) for msg_id in msg_ids]
+            )
+
+    def pending_summary(self):
+        """
+        Processed newsletters (from every mailbox) not yet in a daily summary,
+        as (mailbox, newsletter) pairs.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT mailbox, result FROM jobs WHERE status = ? AND summarized = 0 AND result IS NOT NULL"
+                " ORDER BY updated_at", (DONE,)
+            ).fetchall()
+        return [(mailbox, json.loads(result)) for mailbox, result in rows]
+
+    def mark_summarized(self, keys):
+        """
+        keys: (mailbox, msg_id) pairs included in a written summary.
+        """
+        with self._transaction() as conn:
+            conn.executemany("UPDATE jobs SET summarized = 1 WHERE mailbox = ? AND msg_id = ?", list(keys))
+
+    def stats(self):
+        """
+        {mailbox: {status: count}}, with leased counting only live leases.
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT mailbox, CASE WHEN status = ? AND lease_expires <= ? THEN 'expired' ELSE status END, COUNT(*)"
+                " FROM jobs GROUP BY 1, 2", (LEASED, now)
+            ).fetchall()
+        stats = {}
+        for mailbox, status, count in rows:
+            stats.setdefault(mailbox, {})[status] = count
+        return stats
+
+    def prune(self, retention_days=None):
+        """
+        Drops summarized and failed jobs older than the retention window.
+        Recent done jobs are kept so re-listed messages aren't queued twice.
+        """
+        retention_days = retention_days or float(os.environ.get("QUEUE_RETENTION_DAYS", 7))
+        cutoff = time.time() - retention_days * 86400
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE updated_at < ? AND ((status = ? AND (summarized = 1 OR result IS NULL)) OR status = ?)",
+                (cutoff, DONE, FAILED)
+            )